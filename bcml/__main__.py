@@ -90,6 +90,9 @@ def main(debug: bool = False):
     if (util.get_data_dir() / "settings.json").exists():
         url = f"{host}/index.html"
         width, height = 907, 680
+        # Start the shared worker pool now so it is warm by the first mod operation
+        util.get_pool()
+        util.release_pool()
     else:
         url = f"{host}/index.html?firstrun=yes"
         width, height = 750, 600
@@ -17,7 +17,6 @@ except ImportError:
 import base64
 import json
 import traceback
-from multiprocessing import Pool
 from pathlib import Path
 from platform import system
 from subprocess import run, PIPE, Popen
@@ -249,32 +248,23 @@ class Api:
         }
 
     @win_or_lose
+    @install.serialized
     @install.refresher
     def install_mod(self, params: dict):
         util.vprint(params)
-        with Pool(maxtasksperchild=1000) as pool:
-            selects = (
-                params["selects"] if "selects" in params and params["selects"] else {}
-            )
-            mods = [
-                install.install_mod(
-                    Path(m),
-                    options=params["options"],
-                    selects=selects.get(m, None),
-                    pool=pool,
-                )
-                for m in params["mods"]
-            ]
-            util.vprint(f"Installed {len(mods)} mods")
-            print(f"Installed {len(mods)} mods")
-            try:
-                install.refresh_merges()
-                print("Install complete")
-            except Exception:  # pylint: disable=broad-except
-                pool.terminate()
-                raise
+        selects = (
+            params["selects"] if "selects" in params and params["selects"] else {}
+        )
+        mods = install.install_mods(
+            params["mods"], options=params["options"], selects=selects
+        )
+        util.vprint(f"Installed {len(mods)} mods")
+        print(f"Installed {len(mods)} mods")
+        install.refresh_merges(incremental=True)
+        print("Install complete")
 
     @win_or_lose
+    @install.serialized
     @install.refresher
     def update_mod(self, params):
         try:
@@ -290,25 +280,21 @@ class Api:
             options = {}
         remergers = mergers.get_mergers_for_mod(mod)
         rmtree(mod.path)
-        with Pool(maxtasksperchild=1000) as pool:
-            new_mod = install.install_mod(
-                Path(update_file),
-                insert_priority=mod.priority,
-                options=options,
-                pool=pool,
-            )
-            remergers |= {
-                m
-                for m in mergers.get_mergers_for_mod(new_mod)
-                if m.NAME not in {m.NAME for m in remergers}
-            }
-            try:
-                install.refresh_merges()
-            except Exception:  # pylint: disable=broad-except
-                pool.terminate()
-                raise
+        util.gc_blob_store()
+        new_mod = install.install_mod(
+            Path(update_file),
+            insert_priority=mod.priority,
+            options=options,
+        )
+        remergers |= {
+            m
+            for m in mergers.get_mergers_for_mod(new_mod)
+            if m.NAME not in {m.NAME for m in remergers}
+        }
+        install.refresh_merges()
 
     @win_or_lose
+    @install.serialized
     @install.refresher
     def reprocess(self, params):
         mod = BcmlMod.from_json(params["mod"])
@@ -323,47 +309,36 @@ class Api:
         install.refresh_merges()
 
     @win_or_lose
+    @install.serialized
     @install.refresher
     def uninstall_all(self):
         for folder in {d for d in util.get_modpack_dir().glob("*") if d.is_dir()}:
             rmtree(folder)
+        util.gc_blob_store()
 
     @win_or_lose
     def apply_queue(self, params):
-        mods = []
+        queue = install.ModQueue()
         for move_mod in params["moves"]:
-            mod = BcmlMod.from_json(move_mod["mod"])
-            mods.append(mod)
-            mod.change_priority(move_mod["priority"])
-        with Pool(maxtasksperchild=1000) as pool:
-            for i in params["installs"]:
-                print(i)
-                mods.append(
-                    install.install_mod(
-                        Path(i["path"].replace("QUEUE", "")),
-                        options=i["options"],
-                        insert_priority=i["priority"],
-                        pool=pool,
-                    )
-                )
-                print("Remerging...")
-                try:
-                    install.refresh_merges()
-                except Exception:  # pylint: disable=broad-except
-                    pool.terminate()
-                    raise
-        install.refresh_master_export()
+            queue.move(BcmlMod.from_json(move_mod["mod"]), move_mod["priority"])
+        for i in params["installs"]:
+            queue.install(
+                Path(i["path"].replace("QUEUE", "")),
+                options=i["options"],
+                priority=i["priority"],
+            )
+        queue.apply()
 
     @win_or_lose
     def mod_action(self, params):
         mod = BcmlMod.from_json(params["mod"])
         action = params["action"]
         if action == "enable":
-            install.enable_mod(mod)
+            install.ModQueue().enable(mod).apply()
         elif action == "disable":
-            install.disable_mod(mod)
+            install.ModQueue().disable(mod).apply()
         elif action == "uninstall":
-            install.uninstall_mod(mod)
+            install.ModQueue().uninstall(mod).apply()
         elif action == "update":
             self.update_mod(params)
         elif action == "reprocess":
@@ -415,6 +390,7 @@ class Api:
         Popen(cemu_args, cwd=str(util.get_cemu_dir()))
 
     @win_or_lose
+    @install.serialized
     @install.refresher
     def remerge(self, params):
         try:
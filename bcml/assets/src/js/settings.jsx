@@ -29,6 +29,7 @@ class Settings extends React.Component {
             no_cemu: false,
             wiiu: true,
             no_hardlinks: false,
+            compress_level: 7,
             valid: false
         };
         this.handleChange = this.handleChange.bind(this);
@@ -362,6 +363,33 @@ class Settings extends React.Component {
                                 You must select a game language
                             </Form.Control.Feedback>
                         </Form.Group>
+                        <Form.Group controlId="compress_level">
+                            <Form.Label>Compression Level</Form.Label>
+                            <OverlayTrigger
+                                overlay={
+                                    <Tooltip>
+                                        How hard to compress merged files. Lower
+                                        levels merge faster, which is handy for
+                                        testing in Cemu. Higher levels make
+                                        smaller files for exporting.
+                                    </Tooltip>
+                                }>
+                                <Form.Control
+                                    as="select"
+                                    value={this.state.compress_level}
+                                    onChange={this.handleChange}>
+                                    {[1, 2, 3, 4, 5, 6, 7, 8, 9].map(level => (
+                                        <option value={level} key={level}>
+                                            {level == 1
+                                                ? "1 (fastest)"
+                                                : level == 9
+                                                ? "9 (smallest)"
+                                                : level}
+                                        </option>
+                                    ))}
+                                </Form.Control>
+                            </OverlayTrigger>
+                        </Form.Group>
                         <Form.Group controlId="store_dir">
                             <Form.Label>BCML Data Directory</Form.Label>
                             <FolderInput
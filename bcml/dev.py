@@ -26,13 +26,16 @@ def _yml_to_byml(file: Path):
         big_endian=util.get_settings("wiiu"),
     )
     out = file.with_suffix("")
-    out.write_bytes(data if not out.suffix.startswith(".s") else util.compress(data))
+    util.write_new_file(
+        out, data if not out.suffix.startswith(".s") else util.compress(data)
+    )
     file.unlink()
 
 
 def _yml_to_aamp(file: Path):
-    file.with_suffix("").write_bytes(
-        oead.aamp.ParameterIO.from_text(file.read_text("utf-8")).to_binary()
+    util.write_new_file(
+        file.with_suffix(""),
+        oead.aamp.ParameterIO.from_text(file.read_text("utf-8")).to_binary(),
     )
     file.unlink()
 
@@ -213,7 +216,8 @@ def _clean_sarc_file(file: Path, hashes: dict, tmp_dir: Path):
         file.unlink()
     else:
         write_bytes = new_sarc.write()[1]
-        file.write_bytes(
+        util.write_new_file(
+            file,
             write_bytes
             if not (file.suffix.startswith(".s") and file.suffix != ".ssarc")
             else util.compress(write_bytes)
@@ -270,8 +274,9 @@ def _make_bnp_logs(tmp_dir: Path, options: dict):
             del csarc.files["GameData/gamedata.ssarc"]
         if "GameData/savedataformat.ssarc" in bsarc_files:
             del csarc.files["GameData/savedataformat.ssarc"]
-        (tmp_dir / util.get_content_path() / "Pack" / "Bootup.pack").write_bytes(
-            csarc.write()[1]
+        util.write_new_file(
+            tmp_dir / util.get_content_path() / "Pack" / "Bootup.pack",
+            csarc.write()[1],
         )
 
 
@@ -320,7 +325,8 @@ def create_bnp_mod(mod: Path, output: Path, meta: dict, options: dict = None):
         dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8"
     )
 
-    with Pool() as pool:
+    pool = util.get_pool()
+    try:
         yml_files = set(tmp_dir.glob("**/*.yml"))
         if yml_files:
             print("Compiling YAML documents...")
@@ -358,7 +364,6 @@ def create_bnp_mod(mod: Path, output: Path, meta: dict, options: dict = None):
             for option_dir in {d for d in tmp_dir.glob("options/*") if d.is_dir()}:
                 _make_bnp_logs(option_dir, options)
         except Exception as err:  # pylint: disable=broad-except
-            pool.terminate()
             raise Exception(
                 f"There was an error generating change logs for your mod. {str(err)}"
             )
@@ -366,6 +371,8 @@ def create_bnp_mod(mod: Path, output: Path, meta: dict, options: dict = None):
         _clean_sarcs(tmp_dir, hashes, pool)
         for folder in {d for d in tmp_dir.glob("options/*") if d.is_dir()}:
             _clean_sarcs(folder, hashes, pool)
+    finally:
+        util.release_pool()
 
     print("Cleaning any junk files...")
     for file in {f for f in tmp_dir.rglob("**/*") if f.is_file()}:
@@ -4,23 +4,30 @@
 # pylint: disable=too-many-lines
 import datetime
 import json
+import mmap
 import os
 import re
 import shutil
 import subprocess
+import threading
+import zipfile
 from base64 import b64decode
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from multiprocessing import Pool
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 from platform import system
-from shutil import rmtree, copyfile
+from queue import Empty, Queue
+from shutil import rmtree
 from tempfile import TemporaryDirectory, mkdtemp
 from typing import List, Union, Callable
 from xml.dom import minidom
 
 import oead
+import xxhash
 
 from bcml import util, mergers, dev, upgrade
+from bcml.mergers.rstable import RstbOverlay
 from bcml.util import BcmlMod, ZPATH
 
 
@@ -35,7 +42,85 @@ def extract_mod_meta(mod: Path) -> {}:
     return json.loads(out.decode("utf-8")) if out else {}
 
 
-def open_mod(path: Path) -> Path:
+ZIP_BATCH_SIZE = 64 * 1024 * 1024
+
+
+def _extract_zip_mod(path: Path, tmpdir: Path, pool: Pool = None):
+    """
+    Extracts a ZIP mod, hashing game files in memory so that unmodified ones are
+    never written to disk. Entries are read in batches of up to `ZIP_BATCH_SIZE`
+    bytes, and the game files of each batch are checked on the pool.
+    """
+    with zipfile.ZipFile(path) as archive:
+        entries = [
+            (PurePosixPath(entry.filename.replace("\\", "/")), entry)
+            for entry in archive.infolist()
+            if not entry.is_dir()
+        ]
+        roots = sorted(
+            (
+                name.parent
+                for name, _ in entries
+                if name.name in {"info.json", "rules.txt"}
+            ),
+            key=lambda root: len(root.parts),
+        )
+        root = roots[0] if roots else None
+        rels = {}
+        for name, _ in entries:
+            try:
+                rels[name] = name.relative_to(root) if root else None
+            except ValueError:
+                rels[name] = None
+        # Mods which already have logs were processed when they were packaged
+        processed = any(rel and rel.parts[0] == "logs" for rel in rels.values())
+        table = util.get_hash_table(util.get_settings("wiiu"))
+        batch = {}
+        checks = []
+        batch_size = 0
+
+        def flush():
+            nonlocal batch_size
+            results = this_pool.starmap(
+                util.is_file_modded, [(canon, batch[name]) for name, canon in checks]
+            )
+            for (name, canon), modded in zip(checks, results):
+                if not modded:
+                    util.vprint(f"Ignored unmodded file {canon}")
+                    del batch[name]
+            for name, data in batch.items():
+                out = tmpdir / name
+                out.parent.mkdir(parents=True, exist_ok=True)
+                out.write_bytes(data)
+            batch.clear()
+            checks.clear()
+            batch_size = 0
+
+        this_pool = pool or util.get_pool()
+        try:
+            for name, entry in entries:
+                if name.is_absolute() or ".." in name.parts:
+                    continue
+                batch[name] = archive.read(entry)
+                batch_size += entry.file_size
+                rel = rels[name]
+                if rel and not processed and rel.parts[0] != "options":
+                    try:
+                        canon = util.get_canon_name(rel.as_posix())
+                    except ValueError:
+                        canon = None
+                    # Files the game does not have count as modified without a hash
+                    if canon and canon in table:
+                        checks.append((name, canon))
+                if batch_size >= ZIP_BATCH_SIZE:
+                    flush()
+            flush()
+        finally:
+            if not pool:
+                util.release_pool()
+
+
+def open_mod(path: Path, pool: Pool = None) -> Path:
     if isinstance(path, str):
         path = Path(path)
     tmpdir = Path(TemporaryDirectory().name)
@@ -43,7 +128,10 @@ def open_mod(path: Path) -> Path:
     meta_formats = {".json", ".txt"}
     if tmpdir.exists():
         shutil.rmtree(tmpdir, ignore_errors=True)
-    if path.suffix.lower() in archive_formats:
+    if path.suffix.lower() in archive_formats and zipfile.is_zipfile(path):
+        tmpdir.mkdir(parents=True)
+        _extract_zip_mod(path, tmpdir, pool)
+    elif path.suffix.lower() in archive_formats:
         x_args = [ZPATH, "x", str(path), f"-o{str(tmpdir)}"]
         if system() == "Windows":
             subprocess.run(
@@ -58,7 +146,7 @@ def open_mod(path: Path) -> Path:
                 x_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False
             )
     elif path.suffix.lower() in meta_formats:
-        shutil.copytree(path.parent, tmpdir)
+        util.copy_tree(path.parent, tmpdir)
     else:
         raise ValueError(
             "The mod provided was not a supported archive (BNP, ZIP, RAR, or 7z) "
@@ -95,12 +183,7 @@ def get_next_priority() -> int:
     return i
 
 
-def _check_modded(file: Path, tmp_dir: Path):
-    try:
-        canon = util.get_canon_name(file.relative_to(tmp_dir).as_posix())
-    except ValueError:
-        util.vprint(f"Ignored unknown file {file.relative_to(tmp_dir).as_posix()}")
-        return None
+def _check_modded(file: Path, canon: str):
     if util.is_file_modded(canon, file, True):
         util.vprint(f"Found modded file {canon}")
         return file
@@ -140,76 +223,156 @@ def find_modded_files(tmp_dir: Path, pool: Pool = None) -> List[Union[Path, str]
             for file in aoc_pack.get_files():
                 ex_out = tmp_dir / util.get_dlc_path() / "0010" / file.name
                 ex_out.parent.mkdir(parents=True, exist_ok=True)
-                ex_out.write_bytes(file.data)
-        aoc_field.write_bytes(b"")
+                util.write_new_file(ex_out, file.data)
+        util.write_new_file(aoc_field, b"")
 
-    this_pool = pool or Pool()
-    results = this_pool.map(
-        partial(_check_modded, tmp_dir=tmp_dir),
-        {
+    this_pool = pool or util.get_pool()
+    try:
+        files = {
             f
             for f in tmp_dir.rglob("**/*")
             if f.is_file() and "options" not in f.relative_to(tmp_dir).parts
-        },
-    )
-    for result in results:
-        if result:
-            modded_files.append(result)
-    total = len(modded_files)
-    print(f'Found {total} modified file{"s" if total > 1 else ""}')
-
-    total = 0
-    sarc_files = {f for f in modded_files if f.suffix in util.SARC_EXTS}
-    if sarc_files:
-        print("Scanning files packed in SARCs...")
-        for files in this_pool.imap_unordered(
-            partial(find_modded_sarc_files, tmp_dir=tmp_dir), sarc_files
-        ):
+        }
+        canons = util.get_canon_names(files, tmp_dir)
+        for file in files - canons.keys():
+            util.vprint(f"Ignored unknown file {file.relative_to(tmp_dir).as_posix()}")
+        results = this_pool.starmap(_check_modded, canons.items())
+        for result in results:
+            if result:
+                modded_files.append(result)
+        total = len(modded_files)
+        print(f'Found {total} modified file{"s" if total > 1 else ""}')
+
+        total = 0
+        sarc_files = {f for f in modded_files if f.suffix in util.SARC_EXTS}
+        if sarc_files:
+            print("Scanning files packed in SARCs...")
+            files = find_modded_sarc_files(sarc_files, tmp_dir, this_pool)
             total += len(files)
             modded_files.extend(files)
-        print(f'Found {total} modified packed file{"s" if total > 1 else ""}')
-    if not pool:
-        this_pool.close()
-        this_pool.join()
-    return modded_files
-
-
-def find_modded_sarc_files(
-    mod_sarc: Union[Path, oead.Sarc], tmp_dir: Path, name: str = "", aoc: bool = False
-) -> List[str]:
-    if isinstance(mod_sarc, Path):
-        if any(mod_sarc.name.startswith(exclude) for exclude in ["Bootup_"]):
-            return []
-        name = str(mod_sarc.relative_to(tmp_dir))
-        aoc = util.get_dlc_path() in mod_sarc.parts or "Aoc" in mod_sarc.parts
-        try:
-            mod_sarc = oead.Sarc(util.unyaz_if_needed(mod_sarc.read_bytes()))
-        except (RuntimeError, ValueError, oead.InvalidDataError):
-            return []
+            print(f'Found {total} modified packed file{"s" if total > 1 else ""}')
+        return modded_files
+    finally:
+        if not pool:
+            util.release_pool()
+
+
+SARC_SCAN_CHUNK = 128
+SARC_SCAN_TIMEOUT = 600
+
+
+def _scan_sarc(
+    file: Path,
+    nest: str,
+    name: str,
+    aoc: bool,
+    scratch: Path,
+    start: int = 0,
+    count: int = 0,
+) -> (List[str], List[tuple]):
+    """
+    Scans a slice of a SARC, or of a SARC nested in one, for modified files. The
+    first task for an archive returns tasks for the rest of it and for its modified
+    nested SARCs, so that the pool can spread them over all workers. An archive
+    which had to be decompressed or unpacked is first saved to `scratch` as is, and
+    those tasks map it from there instead of each decompressing it again.
+    """
+    try:
+        with file.open("rb") as stream:
+            view = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        if nest:
+            data = util.unyaz_if_needed(oead.Sarc(view).get_file(nest).data)
+        else:
+            data = util.unyaz_if_needed(view, copy=False)
+        sarc = oead.Sarc(data)
+    except (RuntimeError, ValueError, oead.InvalidDataError):
+        return [], []
+    total = sarc.get_num_files()
+    end = min(start + (count or SARC_SCAN_CHUNK), total)
     modded_files = []
-    for file, contents in [(f.name, bytes(f.data)) for f in mod_sarc.get_files()]:
-        canon = file.replace(".s", ".")
+    nested = []
+    for i in range(start, end):
+        sarc_file = sarc.get_file(i)
+        canon = sarc_file.name.replace(".s", ".")
         if aoc:
             canon = "Aoc/0010/" + canon
-        contents = util.unyaz_if_needed(contents)
-        nest_path = str(name).replace("\\", "/") + "//" + file
-        if util.is_file_modded(canon, contents, True):
+        nest_path = name + "//" + sarc_file.name
+        if util.is_file_modded(canon, sarc_file.data, True):
             modded_files.append(nest_path)
-            util.vprint(f'Found modded file {canon} in {str(name).replace("//", "/")}')
-            if util.is_file_sarc(canon) and ".ssarc" not in file:
-                try:
-                    nest_sarc = oead.Sarc(contents)
-                except ValueError:
-                    continue
-                sub_mod_files = find_modded_sarc_files(
-                    nest_sarc, name=nest_path, tmp_dir=tmp_dir, aoc=aoc
-                )
-                modded_files.extend(sub_mod_files)
+            util.vprint(f'Found modded file {canon} in {name.replace("//", "/")}')
+            if util.is_file_sarc(canon) and ".ssarc" not in sarc_file.name:
+                nested.append(sarc_file.name)
         else:
-            util.vprint(
-                f'Ignored unmodded file {canon} in {str(name).replace("//", "/")}'
+            util.vprint(f'Ignored unmodded file {canon} in {name.replace("//", "/")}')
+    rest = range(end, total, SARC_SCAN_CHUNK) if not count else range(0)
+    if (rest or nested) and (nest or data is not view):
+        source = scratch / f"{xxhash.xxh64_hexdigest(name)}.sarc"
+        source.write_bytes(data)
+    else:
+        source = file
+    tasks = [(source, "", name, aoc, scratch, i, SARC_SCAN_CHUNK) for i in rest]
+    tasks.extend(
+        (source, nested_file, name + "//" + nested_file, aoc, scratch)
+        for nested_file in nested
+    )
+    return modded_files, tasks
+
+
+def find_modded_sarc_files(
+    sarc_files: List[Path], tmp_dir: Path, pool: Pool = None
+) -> List[str]:
+    """
+    Finds the modified files inside a set of SARCs, including nested SARCs. Each
+    archive is split into tasks of up to `SARC_SCAN_CHUNK` files, so one huge pack
+    does not end up on a single core. An archive is only decompressed once; the
+    other tasks for it map a scratch copy from disk.
+    """
+    this_pool = pool or util.get_pool()
+    scratch = Path(mkdtemp())
+    try:
+        results = Queue()
+        pending = 0
+
+        def submit(task: tuple):
+            nonlocal pending
+            pending += 1
+            this_pool.apply_async(
+                _scan_sarc, task, callback=results.put, error_callback=results.put
             )
-    return modded_files
+
+        for sarc_file in sarc_files:
+            if sarc_file.name.startswith("Bootup_"):
+                continue
+            submit(
+                (
+                    sarc_file,
+                    "",
+                    sarc_file.relative_to(tmp_dir).as_posix(),
+                    util.get_dlc_path() in sarc_file.parts or "Aoc" in sarc_file.parts,
+                    scratch,
+                )
+            )
+        modded_files = []
+        while pending:
+            try:
+                result = results.get(timeout=SARC_SCAN_TIMEOUT)
+            except Empty:
+                raise RuntimeError(
+                    "Scanning the SARC files in this mod stopped responding after "
+                    f"{SARC_SCAN_TIMEOUT} seconds."
+                )
+            pending -= 1
+            if isinstance(result, BaseException):
+                raise result
+            files, tasks = result
+            modded_files.extend(files)
+            for task in tasks:
+                submit(task)
+        return modded_files
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if not pool:
+            util.release_pool()
 
 
 def generate_logs(tmp_dir: Path, options: dict = None, pool: Pool = None) -> List[Path]:
@@ -221,17 +384,17 @@ def generate_logs(tmp_dir: Path, options: dict = None, pool: Pool = None) -> Lis
         options["disable"] = []
     util.vprint(options)
 
-    this_pool = pool or Pool()
-    print("Scanning for modified files...")
-    modded_files = find_modded_files(tmp_dir, pool=pool)
-    if not modded_files:
-        raise RuntimeError(
-            f"No modified files were found in {str(tmp_dir)}."
-            "This probably means this mod is not in a supported format."
-        )
-
-    (tmp_dir / "logs").mkdir(parents=True, exist_ok=True)
+    this_pool = pool or util.get_pool()
     try:
+        print("Scanning for modified files...")
+        modded_files = find_modded_files(tmp_dir, pool=this_pool)
+        if not modded_files:
+            raise RuntimeError(
+                f"No modified files were found in {str(tmp_dir)}."
+                "This probably means this mod is not in a supported format."
+            )
+
+        (tmp_dir / "logs").mkdir(parents=True, exist_ok=True)
         for i, merger_class in enumerate(
             [
                 merger_class
@@ -245,14 +408,9 @@ def generate_logs(tmp_dir: Path, options: dict = None, pool: Pool = None) -> Lis
                 merger.set_options(options["options"][merger.NAME])
             merger.set_pool(this_pool)
             merger.log_diff(tmp_dir, modded_files)
-    except:  # pylint: disable=bare-except
-        this_pool.close()
-        this_pool.join()
-        this_pool.terminate()
-        raise
-    if not pool:
-        this_pool.close()
-        this_pool.join()
+    finally:
+        if not pool:
+            util.release_pool()
     util.vprint(modded_files)
     return modded_files
 
@@ -260,7 +418,8 @@ def generate_logs(tmp_dir: Path, options: dict = None, pool: Pool = None) -> Lis
 def refresher(func: Callable) -> Callable:
     def do_and_refresh(*args, **kwargs):
         res = func(*args, **kwargs)
-        refresh_master_export()
+        if not kwargs.get("wait_merge"):
+            refresh_master_export()
         return res
 
     return do_and_refresh
@@ -312,23 +471,20 @@ def refresh_master_export():
             )
 
 
-def install_mod(
-    mod: Path,
-    options: dict = None,
-    selects: dict = None,
-    pool: Pool = None,
-    insert_priority: int = 0,
-    merge_now: bool = False,
-):
-    if not insert_priority:
-        insert_priority = get_next_priority()
-
+def prepare_mod(
+    mod: Path, options: dict = None, selects: dict = None, pool: Pool = None
+) -> Union[tuple, None]:
+    """
+    Opens a mod, checks it and logs its changes in a temp folder, without touching
+    the installed mods. Returns what `commit_mod` needs to finish installing it, or
+    None if the mod could not be opened.
+    """
     try:
         if isinstance(mod, str):
             mod = Path(mod)
         if mod.is_file():
             print("Opening mod...")
-            tmp_dir = open_mod(mod)
+            tmp_dir = open_mod(mod, pool)
         elif mod.is_dir():
             if not ((mod / "rules.txt").exists() or (mod / "info.json").exists()):
                 print(f"Cannot open mod at {str(mod)}, no rules.txt or info.json found")
@@ -337,7 +493,7 @@ def install_mod(
             tmp_dir = Path(mkdtemp())
             if tmp_dir.exists():
                 shutil.rmtree(tmp_dir)
-            shutil.copytree(str(mod), str(tmp_dir))
+            util.copy_tree(mod, tmp_dir)
             if (mod / "rules.txt").exists() and not (mod / "info.json").exists():
                 print("Upgrading old mod format...")
                 upgrade.convert_old_mod(mod, delete_old=True)
@@ -350,7 +506,6 @@ def install_mod(
     if not options:
         options = {"options": {}, "disable": []}
 
-    this_pool: Pool = None
     try:
         rules = json.loads((tmp_dir / "info.json").read_text("utf-8"))
         mod_name = rules["name"].strip(" '\"").replace("_", "")
@@ -392,7 +547,6 @@ def install_mod(
                 if merger.is_mod_logged(BcmlMod(tmp_dir)):
                     (tmp_dir / "logs" / merger.log_name).unlink()
         else:
-            this_pool = pool or Pool()
             generate_logs(tmp_dir=tmp_dir, options=options, pool=pool)
             (tmp_dir / ".processed").touch()
     except Exception as err:  # pylint: disable=broad-except
@@ -437,10 +591,10 @@ def install_mod(
                             link_files = {f.name for f in link_sarc.get_files()}
                             for sarc_file in old_sarc.get_files():
                                 if sarc_file.name not in link_files:
-                                    new_sarc.files[sarc_file.name] = bytes(sarc_file.data)
+                                    new_sarc.files[sarc_file.name] = sarc_file.data
                             del old_sarc
                             del link_sarc
-                            out.write_bytes(new_sarc.write()[1])
+                            util.write_new_file(out, new_sarc.write()[1])
                             del new_sarc
                         else:
                             out.unlink()
@@ -455,8 +609,13 @@ def install_mod(
     )
     if rstb_path.exists():
         rstb_path.unlink()
+    return mod, tmp_dir, rules, mod_name, options
+
 
-    priority = insert_priority
+def commit_mod(prepared: tuple, insert_priority: int = 0) -> BcmlMod:
+    """Moves a mod prepared by `prepare_mod` into the mod folder at a priority"""
+    mod, tmp_dir, rules, mod_name, options = prepared
+    priority = insert_priority or get_next_priority()
     print(f"Assigned mod priority of {priority}")
     mod_id = util.get_mod_id(mod_name, priority)
     mod_dir = util.get_modpack_dir() / mod_id
@@ -468,21 +627,13 @@ def install_mod(
 
         mod_dir.parent.mkdir(parents=True, exist_ok=True)
         print(f"Moving mod to {str(mod_dir)}...")
-        if mod.is_file():
-            try:
-                shutil.move(str(tmp_dir), str(mod_dir))
-            except Exception:  # pylint: disable=broad-except
-                try:
-                    shutil.rmtree(str(mod_dir))
-                    shutil.copytree(str(tmp_dir), str(mod_dir))
-                    shutil.rmtree(str(tmp_dir), ignore_errors=True)
-                except Exception:  # pylint: disable=broad-except
-                    raise OSError(
-                        "BCML could not transfer your mod from the temp directory to the"
-                        " BCML directory."
-                    )
-        elif mod.is_dir():
-            shutil.copytree(str(tmp_dir), str(mod_dir))
+        try:
+            util.store_mod_files(tmp_dir, mod_dir, move=True)
+        except Exception:  # pylint: disable=broad-except
+            raise OSError(
+                "BCML could not transfer your mod from the temp directory to the"
+                " BCML directory."
+            )
         shutil.rmtree(tmp_dir, ignore_errors=True)
 
         rules["priority"] = priority
@@ -507,26 +658,99 @@ def install_mod(
                 uninstall_mod(mod_dir, wait_merge=True)
             except Exception:  # pylint: disable=broad-except
                 shutil.rmtree(str(mod_dir))
+                util.gc_blob_store()
         raise util.InstallError(err, mod_name) from err
+    return output_mod
+
 
+def install_mod(
+    mod: Path,
+    options: dict = None,
+    selects: dict = None,
+    pool: Pool = None,
+    insert_priority: int = 0,
+    merge_now: bool = False,
+):
+    this_pool = pool or util.get_pool()
+    util.clear_sarc_caches()
     try:
-        if merge_now:
-            all_mergers = set()
-            for merger in {m() for m in mergers.get_mergers()}:
-                if merger.is_mod_logged(output_mod):
-                    all_mergers.add(merger)
-            for merger in mergers.sort_mergers(all_mergers):
-                merger.set_pool(this_pool)
-                merger.perform_merge()
-    except Exception as err:  # pylint: disable=broad-except
-        raise util.MergeError(err) from err
+        prepared = prepare_mod(mod, options=options, selects=selects, pool=this_pool)
+        if not prepared:
+            return None
+        output_mod = commit_mod(prepared, insert_priority)
+
+        try:
+            if merge_now:
+                all_mergers = set()
+                for merger in {m() for m in mergers.get_mergers()}:
+                    if merger.is_mod_logged(output_mod):
+                        all_mergers.add(merger)
+                for merger in mergers.sort_mergers(all_mergers):
+                    merger.set_pool(this_pool)
+                    merger.perform_merge()
+        except Exception as err:  # pylint: disable=broad-except
+            raise util.MergeError(err) from err
+    finally:
+        if not pool:
+            util.release_pool()
 
-    if this_pool and not pool:
-        this_pool.close()
-        this_pool.join()
     return output_mod
 
 
+MAX_CONCURRENT_INSTALLS = 4
+
+
+def install_mods(
+    mods: List[Path], options: dict = None, selects: dict = None, pool: Pool = None
+) -> List[BcmlMod]:
+    """
+    Installs several mods without merging them. Up to `MAX_CONCURRENT_INSTALLS` mods
+    are opened and logged at once, sharing the process pool, while finished ones are
+    moved into place in the order given, so they get the same priorities as if they
+    had been installed one at a time. Run `refresh_merges` once afterward.
+    """
+    this_pool = pool or util.get_pool()
+    util.clear_sarc_caches()
+    selects = selects or {}
+    installed = []
+    futures = []
+    try:
+        with ThreadPoolExecutor(
+            max_workers=max(min(len(mods), MAX_CONCURRENT_INSTALLS), 1)
+        ) as executor:
+            futures = [
+                executor.submit(
+                    prepare_mod,
+                    Path(mod),
+                    options=deepcopy(options),
+                    selects=selects.get(str(mod), None),
+                    pool=this_pool,
+                )
+                for mod in mods
+            ]
+            try:
+                for future in futures:
+                    prepared = future.result()
+                    if prepared:
+                        installed.append(commit_mod(prepared))
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        # Leaving the executor waits for any preparation still running, so by now
+        # nothing uses the pool, and mods prepared but never committed can go
+        for future in futures:
+            if future.cancelled() or future.exception() or not future.result():
+                continue
+            tmp_dir = future.result()[1]
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not pool:
+            util.release_pool()
+    return installed
+
+
 @refresher
 def disable_mod(mod: BcmlMod, wait_merge: bool = False):
     remergers = []
@@ -537,7 +761,7 @@ def disable_mod(mod: BcmlMod, wait_merge: bool = False):
     (mod.path / ".disabled").write_bytes(b"")
     if not wait_merge:
         print("Remerging...")
-        refresh_merges()
+        refresh_merges(incremental=True)
     print(f"{mod.name} disabled")
 
 
@@ -547,7 +771,7 @@ def enable_mod(mod: BcmlMod, wait_merge: bool = False):
     (mod.path / ".disabled").unlink()
     if not wait_merge:
         print("Remerging...")
-        refresh_merges()
+        refresh_merges(incremental=True)
     print(f"{mod.name} enabled")
 
 
@@ -570,26 +794,157 @@ def uninstall_mod(mod: BcmlMod, wait_merge: bool = False):
     ]:
         fall_mod.change_priority(fall_mod.priority - 1)
 
+    util.vprint(f"Freed {util.gc_blob_store()} bytes of unused mod files")
     if not util.get_installed_mods():
         shutil.rmtree(util.get_master_modpack_dir())
         util.create_bcml_graphicpack_if_needed()
     else:
         if not wait_merge:
-            refresh_merges()
+            refresh_merges(incremental=True)
 
     print(f"{mod.name} has been uninstalled.")
 
 
-def refresh_merges():
-    print("Cleansing old merges...")
-    shutil.rmtree(util.get_master_modpack_dir(), True)
+def refresh_merges(incremental: bool = False):
+    all_mergers = mergers.sort_mergers(
+        [merger_class() for merger_class in mergers.get_mergers()]
+    )
+    fingerprints = {merger.NAME: merger.get_fingerprint() for merger in all_mergers}
+    remergers = (
+        mergers.get_stale_mergers(all_mergers, fingerprints)
+        if incremental
+        else all_mergers
+    )
+    if len(remergers) == len(all_mergers):
+        print("Cleansing old merges...")
+        shutil.rmtree(util.get_master_modpack_dir(), True)
+        util.create_bcml_graphicpack_if_needed()
+    elif not remergers:
+        print("No merges need to be refreshed")
+        return
+    else:
+        print(
+            "Skipping unchanged merges: "
+            + ", ".join(m.friendly_name for m in all_mergers if m not in remergers)
+        )
+        mergers.get_fingerprint_log().unlink()
     print("Refreshing merged mods...")
-    with Pool() as pool:
-        for merger in mergers.sort_mergers(
-            [merger_class() for merger_class in mergers.get_mergers()]
-        ):
-            merger.set_pool(pool)
-            merger.perform_merge()
+    pool = util.get_pool()
+    util.clear_sarc_caches()
+    try:
+        # Collect RSTB edits from every merger and write the table once at the end
+        with util.SarcTransaction(pool) as transaction, RstbOverlay(master=True):
+            for merger in remergers:
+                if merger.NAME == "rstb":
+                    # The RSTB merger measures the merged files, so write them first
+                    transaction.commit()
+                merger.set_pool(pool)
+                merger.perform_merge()
+    finally:
+        util.release_pool()
+    util.vprint(f"SARC cache: {util.get_sarc_cache()}")
+    util.get_sarc_cache().clear()
+    mergers.get_fingerprint_log().parent.mkdir(parents=True, exist_ok=True)
+    mergers.get_fingerprint_log().write_text(
+        json.dumps(fingerprints, indent=2), encoding="utf-8"
+    )
+
+
+class ModQueue:
+    """
+    A batch of mod actions: priority moves, installs, enables, disables and
+    uninstalls. `apply` makes all of the file changes first and then runs one
+    remerge and one export. Batches from different threads are applied one at a
+    time, and a batch skips its remerge if another one has already covered it.
+    Other operations which change the installed mods should hold `lock` as well.
+
+    Mods are queued by ID rather than by path, since moves, installs and uninstalls
+    rename the folders of other mods. Each one is looked up again when its turn
+    comes.
+    """
+
+    lock = threading.RLock()
+    _changes: int = 0
+    _merged: int = 0
+
+    def __init__(self):
+        self._moves = {}
+        self._installs = {}
+        self._actions = {}
+
+    @staticmethod
+    def _find_mod(mod_id: str) -> BcmlMod:
+        for mod in util.get_installed_mods(True):
+            if mod.id == mod_id:
+                return mod
+        return None
+
+    def move(self, mod: BcmlMod, priority: int) -> "ModQueue":
+        self._moves[mod.id] = priority
+        return self
+
+    def install(
+        self, path: Path, options: dict = None, priority: int = 0
+    ) -> "ModQueue":
+        self._installs[Path(path)] = (options, priority)
+        return self
+
+    def enable(self, mod: BcmlMod) -> "ModQueue":
+        self._actions[mod.id] = enable_mod
+        return self
+
+    def disable(self, mod: BcmlMod) -> "ModQueue":
+        self._actions[mod.id] = disable_mod
+        return self
+
+    def uninstall(self, mod: BcmlMod) -> "ModQueue":
+        self._actions[mod.id] = uninstall_mod
+        self._moves.pop(mod.id, None)
+        return self
+
+    def apply(self, pool: Pool = None) -> List[BcmlMod]:
+        """Applies the queued actions, then remerges and exports once"""
+        installed = []
+        with ModQueue.lock:
+            for mod_id, priority in self._moves.items():
+                mod = self._find_mod(mod_id)
+                if mod:
+                    mod.change_priority(priority)
+            for path, (options, priority) in self._installs.items():
+                print(f"Installing {path.name}...")
+                new_mod = install_mod(
+                    path, options=options, insert_priority=priority, pool=pool
+                )
+                if new_mod:
+                    installed.append(new_mod)
+            for mod_id, action in self._actions.items():
+                mod = self._find_mod(mod_id)
+                if not mod:
+                    util.vprint(f"Skipped a queued action for missing mod {mod_id}")
+                    continue
+                action(mod, wait_merge=True)
+            ModQueue._changes += 1
+            batch = ModQueue._changes
+        with ModQueue.lock:
+            if ModQueue._merged >= batch:
+                return installed
+            target = ModQueue._changes
+            if util.get_installed_mods():
+                print("Remerging...")
+                refresh_merges(incremental=True)
+            refresh_master_export()
+            ModQueue._merged = target
+        return installed
+
+
+def serialized(func: Callable) -> Callable:
+    """Runs a function which changes the installed mods while holding `ModQueue.lock`"""
+
+    def do_serialized(*args, **kwargs):
+        with ModQueue.lock:
+            return func(*args, **kwargs)
+
+    return do_serialized
 
 
 def create_backup(name: str = ""):
@@ -627,6 +982,7 @@ def restore_backup(backup: Union[str, Path]):
     print("Clearing installed mods...")
     for folder in [item for item in util.get_modpack_dir().glob("*") if item.is_dir()]:
         shutil.rmtree(str(folder))
+    util.gc_blob_store()
     print("Extracting backup...")
     x_args = [ZPATH, "x", str(backup), f"-o{str(util.get_modpack_dir())}"]
     if system() == "Windows":
@@ -673,11 +1029,13 @@ def link_master_mod(output: Path = None):
         reverse=True,
     )
     util.vprint(mod_folders)
-    link_or_copy = os.link if not util.get_settings("no_hardlinks") else copyfile
+    # Plan every file first, highest priority mod winning, then transfer them in bulk
+    planned = set()
+    transfers = []
     for mod_folder in mod_folders:
         for item in mod_folder.rglob("**/*"):
             rel_path = item.relative_to(mod_folder)
-            exists = (output / rel_path).exists()
+            exists = rel_path in planned or (output / rel_path).exists()
             is_log = str(rel_path).startswith("logs")
             is_opt = str(rel_path).startswith("options")
             is_meta = str(rel_path).startswith("meta")
@@ -691,14 +1049,9 @@ def link_master_mod(output: Path = None):
             if item.is_dir():
                 (output / rel_path).mkdir(parents=True, exist_ok=True)
             elif item.is_file():
-                try:
-                    link_or_copy(str(item), str(output / rel_path))
-                except OSError:
-                    if link_or_copy is os.link:
-                        link_or_copy = copyfile
-                        link_or_copy(str(item), str(output / rel_path))
-                    else:
-                        raise
+                planned.add(rel_path)
+                transfers.append((item, output / rel_path))
+    util.transfer_files(transfers, link=not util.get_settings("no_hardlinks"))
 
 
 def export(output: Path):
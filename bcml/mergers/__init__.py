@@ -1,9 +1,27 @@
 """ Provides abstracted merging objects """
+import json
 from abc import ABCMeta
 from multiprocessing import Pool
 from pathlib import Path
 from typing import List, Union
+
+import xxhash
+
 from bcml import util
+from bcml.__version__ import VERSION
+
+# Settings which change what the mergers write, and so are part of every fingerprint
+FINGERPRINT_SETTINGS = (
+    "wiiu",
+    "lang",
+    "no_guess",
+    "compress_level",
+    "game_dir",
+    "game_dir_nx",
+    "update_dir",
+    "dlc_dir",
+    "dlc_dir_nx",
+)
 
 
 class Merger(metaclass=ABCMeta):
@@ -96,6 +114,38 @@ class Merger(metaclass=ABCMeta):
         """ Gets whatever file this merger needs to inject into `Bootup.pack` """
         return (None, None)
 
+    @staticmethod
+    def get_dependencies() -> set:
+        """ Gets the names of mergers which force this merger to rerun if they do """
+        return set()
+
+    def get_fingerprint(self) -> str:
+        """ Gets a digest of the logs, mod order and settings this merge depends on """
+        fingerprint = xxhash.xxh64(VERSION)
+        fingerprint.update(json.dumps(self._options, sort_keys=True, default=str))
+        fingerprint.update(
+            json.dumps(
+                {name: util.get_settings(name) for name in FINGERPRINT_SETTINGS},
+                sort_keys=True,
+                default=str,
+            )
+        )
+        fingerprint.update(util.get_hash_table_id(util.get_settings("wiiu")))
+        for mod in util.get_installed_mods():
+            for log in [
+                mod.path / "logs" / self._log_name,
+                *sorted(
+                    opt / "logs" / self._log_name
+                    for opt in (mod.path / "options").glob("*")
+                    if opt.is_dir()
+                ),
+            ]:
+                if log.exists():
+                    fingerprint.update(mod.name)
+                    fingerprint.update(log.relative_to(mod.path).as_posix())
+                    fingerprint.update(log.read_bytes())
+        return fingerprint.hexdigest()
+
     def get_mod_affected(
         self, mod: util.BcmlMod  # pylint: disable=unused-argument
     ) -> []:
@@ -164,3 +214,28 @@ def sort_mergers(mergers: List[Merger]) -> List[Merger]:
     return sorted(
         mergers, key=lambda merger: merger_names.index(merger.NAME), reverse=False,
     )
+
+
+def get_fingerprint_log() -> Path:
+    return util.get_master_modpack_dir() / "logs" / "fingerprints.json"
+
+
+def get_stale_mergers(merger_list: List[Merger], fingerprints: dict) -> List[Merger]:
+    """ Finds which mergers need to be rerun since the last recorded merge """
+    try:
+        old_prints = json.loads(get_fingerprint_log().read_text("utf-8"))
+    except (FileNotFoundError, ValueError):
+        return list(merger_list)
+    stale = {
+        merger.NAME
+        for merger in merger_list
+        if old_prints.get(merger.NAME) != fingerprints[merger.NAME]
+    }
+    changed = True
+    while changed:
+        changed = False
+        for merger in merger_list:
+            if merger.NAME not in stale and merger.get_dependencies() & stale:
+                stale.add(merger.NAME)
+                changed = True
+    return [m for m in merger_list if m.NAME in stale]
@@ -11,8 +11,11 @@ from bcml.util import BcmlMod
 
 
 def get_stock_actorinfo() -> oead.byml.Hash:
-    actorinfo = util.get_game_file("Actor/ActorInfo.product.sbyml")
-    return oead.byml.from_binary(util.decompress(actorinfo.read_bytes()))
+    return oead.byml.from_binary(
+        util.get_stock_file_bytes(
+            str(util.get_game_file("Actor/ActorInfo.product.sbyml"))
+        )
+    )
 
 
 class ActorInfoMerger(mergers.Merger):
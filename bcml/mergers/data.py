@@ -6,10 +6,8 @@ Provides functions to diff and merge BOTW gamedat and savedata.
 # pylint: disable=unsupported-assignment-operation
 from functools import lru_cache
 from math import ceil
-from multiprocessing import Pool
-from operator import itemgetter
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, Iterable, List, Tuple, Union
 
 import oead
 import xxhash
@@ -20,14 +18,19 @@ from bcml.util import BcmlMod
 
 
 def get_stock_gamedata() -> oead.Sarc:
-    bootup = oead.Sarc(util.get_game_file("Pack/Bootup.pack").read_bytes())
-    return oead.Sarc(util.decompress(bootup.get_file("GameData/gamedata.ssarc").data))
+    return oead.Sarc(
+        util.get_stock_file_bytes(
+            str(util.get_game_file("Pack/Bootup.pack")) + "//GameData/gamedata.ssarc"
+        )
+    )
 
 
 def get_stock_savedata() -> oead.Sarc:
-    bootup = oead.Sarc(util.get_game_file("Pack/Bootup.pack").read_bytes())
     return oead.Sarc(
-        util.decompress(bootup.get_file("GameData/savedataformat.ssarc").data)
+        util.get_stock_file_bytes(
+            str(util.get_game_file("Pack/Bootup.pack"))
+            + "//GameData/savedataformat.ssarc"
+        )
     )
 
 
@@ -58,63 +61,143 @@ def is_savedata_modded(savedata: oead.Sarc) -> {}:
     return modded
 
 
-def _bgdata_from_bytes(file: str, game_dict: dict) -> {}:
-    return oead.byml.from_binary(game_dict[file])
+class FlagTable:
+    """
+    A columnar table of gamedata flags. Each flag is a row holding its data type,
+    DataName and full BYML entry, with a (type, name) index into the rows. Diffs
+    and merges work on the columns, and BYML is only built again when the table is
+    written out to bgdata files.
+    """
 
+    types: List[str]
+    names: List[str]
+    entries: List[oead.byml.Hash]
+    _index: Dict[Tuple[str, str], int]
 
-def consolidate_gamedata(gamedata: oead.Sarc) -> {}:
-    data = {}
-    for file in gamedata.get_files():
-        util.dict_merge(data, oead.byml.from_binary(file.data))
-    del gamedata
-    return data
+    def __init__(self):
+        self.types = []
+        self.names = []
+        self.entries = []
+        self._index = {}
+
+    @classmethod
+    def from_sarc(cls, gamedata: oead.Sarc) -> "FlagTable":
+        table = cls()
+        for file in gamedata.get_files():
+            for data_type, entries in oead.byml.from_binary(file.data).items():
+                for entry in entries:
+                    table.set_flag(data_type, entry)
+        return table
+
+    def copy(self) -> "FlagTable":
+        table = FlagTable()
+        table.types = self.types.copy()
+        table.names = self.names.copy()
+        table.entries = self.entries.copy()
+        table._index = self._index.copy()
+        return table
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_rows(self) -> Dict[str, List[int]]:
+        """Gets the live rows of each data type, in table order"""
+        rows = {}
+        for row, data_type in enumerate(self.types):
+            if self.entries[row] is not None:
+                rows.setdefault(data_type, []).append(row)
+        return rows
+
+    def get_flag(self, data_type: str, name: str) -> oead.byml.Hash:
+        row = self._index.get((data_type, name))
+        return self.entries[row] if row is not None else None
+
+    def set_flag(self, data_type: str, entry: oead.byml.Hash):
+        name = str(entry["DataName"])
+        row = self._index.get((data_type, name))
+        if row is None:
+            self._index[(data_type, name)] = len(self.names)
+            self.types.append(data_type)
+            self.names.append(name)
+            self.entries.append(entry)
+        else:
+            self.entries[row] = entry
+
+    def delete_flag(self, data_type: str, name: str):
+        row = self._index.pop((data_type, name), None)
+        if row is not None:
+            self.entries[row] = None
+
+    def diff(self, stock: "FlagTable") -> oead.byml.Hash:
+        """Gets the flags added, changed or removed relative to a stock table"""
+        diffs = {}
+        stock_rows = stock.get_rows()
+        for data_type, rows in self.get_rows().items():
+            add = {}
+            for row in rows:
+                entry = self.entries[row]
+                stock_row = stock._index.get((data_type, self.names[row]))
+                if stock_row is None:
+                    add[self.names[row]] = entry
+                    continue
+                stock_entry = stock.entries[stock_row]
+                # Rows copied from the stock table share their entry, so only
+                # compare the contents of rows which were set again
+                if entry is not stock_entry and entry != stock_entry:
+                    add[self.names[row]] = entry
+            removed = [
+                stock.names[row]
+                for row in stock_rows.get(data_type, [])
+                if (data_type, stock.names[row]) not in self._index
+            ]
+            diffs[data_type] = oead.byml.Hash(
+                {"add": oead.byml.Hash(add), "del": oead.byml.Array(removed)}
+            )
+        return oead.byml.Hash(diffs)
+
+    def apply(self, diffs: oead.byml.Hash):
+        """Applies a consolidated gamedata diff to the data types already present"""
+        types = set(self.types)
+        for data_type, diff in diffs.items():
+            if data_type not in types:
+                continue
+            for entry in diff["add"].values():
+                self.set_flag(data_type, entry)
+            for name in diff["del"]:
+                self.delete_flag(data_type, str(name))
+
+    def to_files(self, be: bool) -> Dict[str, bytes]:
+        """Writes the table out as bgdata files of up to 4096 flags each"""
+        files = {}
+        for data_type, rows in self.get_rows().items():
+            for i in range(ceil(len(rows) / 4096)):
+                files[f"/{data_type}_{i}.bgdata"] = oead.byml.to_binary(
+                    oead.byml.Hash(
+                        {
+                            data_type: oead.byml.Array(
+                                [self.entries[row] for row in rows[i * 4096 :][:4096]]
+                            )
+                        }
+                    ),
+                    big_endian=be,
+                )
+        return files
 
 
-def diff_gamedata_type(data_type: str, mod_data: dict, stock_data: dict) -> {}:
-    stock_entries = {entry["DataName"]: entry for entry in stock_data}
-    del stock_data
-    mod_entries = {entry["DataName"] for entry in mod_data}
-    diffs = oead.byml.Hash(
-        {
-            "add": oead.byml.Hash(
-                {
-                    entry["DataName"]: entry
-                    for entry in mod_data
-                    if (
-                        entry["DataName"] not in stock_entries
-                        or entry != stock_entries[entry["DataName"]]
-                    )
-                }
-            ),
-            "del": oead.byml.Array(
-                {entry for entry in stock_entries if entry not in mod_entries}
-            ),
-        }
-    )
-    del stock_entries
-    del mod_entries
-    del mod_data
-    return oead.byml.Hash({data_type: diffs})
-
-
-def get_modded_gamedata_entries(gamedata: oead.Sarc, pool: Pool = None) -> {}:
-    this_pool = pool or Pool()
-    stock_data = consolidate_gamedata(get_stock_gamedata())
-    mod_data = consolidate_gamedata(gamedata)
-    del gamedata
-    results = this_pool.starmap(
-        diff_gamedata_type, ((key, mod_data[key], stock_data[key]) for key in mod_data),
+def get_stock_flag_table() -> FlagTable:
+    return _get_stock_flag_table(
+        util.get_settings("wiiu"), util.get_game_file("Pack/Bootup.pack")
     )
-    diffs = oead.byml.Hash(
-        {data_type: diff for d in results for data_type, diff in d.items()}
-    )
-    del results
-    if not pool:
-        this_pool.close()
-        this_pool.join()
-    del stock_data
-    del mod_data
-    return diffs
+
+
+@lru_cache(2)
+def _get_stock_flag_table(wiiu: bool, bootup_path: Path) -> FlagTable:
+    # pylint: disable=unused-argument
+    return FlagTable.from_sarc(get_stock_gamedata())
+
+
+def get_modded_gamedata_entries(gamedata: oead.Sarc) -> {}:
+    return FlagTable.from_sarc(gamedata).diff(get_stock_flag_table())
 
 
 def get_modded_savedata_entries(savedata: oead.Sarc) -> {}:
@@ -143,6 +226,19 @@ def get_modded_savedata_entries(savedata: oead.Sarc) -> {}:
     )
 
 
+def merge_savedata_entries(
+    stock_entries: Iterable[oead.byml.Hash], added_entries: Iterable[oead.byml.Hash]
+) -> oead.byml.Array:
+    """
+    Merges added save data flags over the stock ones by hash and sorts them by hash.
+    Logged deletions are not applied here, as the save data merge has never removed
+    stock flags.
+    """
+    entries = {int(entry["HashValue"]): entry for entry in stock_entries}
+    entries.update({int(entry["HashValue"]): entry for entry in added_entries})
+    return oead.byml.Array([entries[key] for key in sorted(entries)])
+
+
 class GameDataMerger(mergers.Merger):
     # pylint: disable=abstract-method
     NAME: str = "gamedata"
@@ -168,7 +264,7 @@ class GameDataMerger(mergers.Merger):
             data_sarc = oead.Sarc(
                 util.decompress(bootup_sarc.get_file("GameData/gamedata.ssarc").data)
             )
-            diff = get_modded_gamedata_entries(data_sarc, pool=self._pool)
+            diff = get_modded_gamedata_entries(data_sarc)
             del bootup_sarc
             del data_sarc
             return diff
@@ -242,56 +338,46 @@ class GameDataMerger(mergers.Merger):
                 glog_path.unlink()
             if (util.get_master_modpack_dir() / "logs" / "gamedata.sarc").exists():
                 (util.get_master_modpack_dir() / "logs" / "gamedata.sarc").unlink()
+                try:
+                    util.inject_file_into_sarc(
+                        "GameData/gamedata.ssarc",
+                        util.get_nested_file_bytes(
+                            str(util.get_game_file("Pack/Bootup.pack"))
+                            + "//GameData/gamedata.ssarc",
+                            unyaz=False,
+                        ),
+                        "Pack/Bootup.pack",
+                    )
+                except FileNotFoundError:
+                    pass
             return
-        if glog_path.exists() and not force:
+        bootup_path = (
+            util.get_master_modpack_dir()
+            / util.get_content_path()
+            / "Pack"
+            / "Bootup.pack"
+        )
+        if glog_path.exists() and bootup_path.exists() and not force:
             with glog_path.open("r") as l_file:
                 if xxhash.xxh64_hexdigest(str(modded_entries)) == l_file.read():
                     print("No gamedata merging necessary.")
                     return
 
         print("Loading stock gamedata...")
-        gamedata = consolidate_gamedata(get_stock_gamedata())
-        merged_entries = {
-            data_type: oead.byml.Hash({entry["DataName"]: entry for entry in entries})
-            for data_type, entries in gamedata.items()
-        }
-        del gamedata
+        flags = get_stock_flag_table().copy()
 
         print("Merging changes...")
-        for data_type in {d for d in merged_entries if d in modded_entries}:
-            util.dict_merge(
-                merged_entries[data_type], modded_entries[data_type]["add"], shallow=True,
-            )
-            for entry in modded_entries[data_type]["del"]:
-                try:
-                    del merged_entries[data_type][entry]
-                except KeyError:
-                    continue
+        flags.apply(modded_entries)
 
-        merged_entries = oead.byml.Hash(
-            {
-                data_type: oead.byml.Array({value for _, value in entries.items()})
-                for data_type, entries in merged_entries.items()
-            }
-        )
         print("Creating and injecting new gamedata.sarc...")
         new_gamedata = oead.SarcWriter(
             endian=oead.Endianness.Big
             if util.get_settings("wiiu")
             else oead.Endianness.Little
         )
-        for data_type in merged_entries:
-            num_files = ceil(len(merged_entries[data_type]) / 4096)
-            for i in range(num_files):
-                end_pos = (i + 1) * 4096
-                if end_pos > len(merged_entries[data_type]):
-                    end_pos = len(merged_entries[data_type])
-                new_gamedata.files[f"/{data_type}_{i}.bgdata"] = oead.byml.to_binary(
-                    oead.byml.Hash(
-                        {data_type: merged_entries[data_type][i * 4096 : end_pos]}
-                    ),
-                    big_endian=util.get_settings("wiiu"),
-                )
+        for file, data in flags.to_files(util.get_settings("wiiu")).items():
+            new_gamedata.files[file] = data
+        del flags
         new_gamedata_bytes = new_gamedata.write()[1]
         del new_gamedata
         util.inject_file_into_sarc(
@@ -316,6 +402,10 @@ class GameDataMerger(mergers.Merger):
         with glog_path.open("w", encoding="utf-8") as l_file:
             l_file.write(xxhash.xxh64_hexdigest(str(modded_entries)))
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"packs"}
+
     def get_checkbox_options(self):
         return [("force", "Remerge game data even if no changes detected")]
 
@@ -404,14 +494,16 @@ class SaveDataMerger(mergers.Merger):
             return {}
         all_diffs = oead.byml.Hash({"add": oead.byml.Array(), "del": oead.byml.Array()})
         hashes = set()
+        deletions = {}
         for diff in reversed(diffs):
             for entry in diff["add"]:
-                if entry["HashValue"] not in hashes:
+                hash_value = int(entry["HashValue"])
+                if hash_value not in hashes:
                     all_diffs["add"].append(entry)
-                hashes.add(entry["HashValue"])
+                    hashes.add(hash_value)
             for entry in diff["del"]:
-                if entry not in all_diffs["del"]:
-                    all_diffs["del"].append(entry)
+                deletions.setdefault(int(entry), entry)
+        all_diffs["del"] = oead.byml.Array(list(deletions.values()))
         del hashes
         return all_diffs
 
@@ -427,8 +519,26 @@ class SaveDataMerger(mergers.Merger):
                 slog_path.unlink()
             if (util.get_master_modpack_dir() / "logs" / "savedata.sarc").exists():
                 (util.get_master_modpack_dir() / "logs" / "savedata.sarc").unlink()
+                try:
+                    util.inject_file_into_sarc(
+                        "GameData/savedataformat.ssarc",
+                        util.get_nested_file_bytes(
+                            str(util.get_game_file("Pack/Bootup.pack"))
+                            + "//GameData/savedataformat.ssarc",
+                            unyaz=False,
+                        ),
+                        "Pack/Bootup.pack",
+                    )
+                except FileNotFoundError:
+                    pass
             return
-        if slog_path.exists() and not force:
+        bootup_path = (
+            util.get_master_modpack_dir()
+            / util.get_content_path()
+            / "Pack"
+            / "Bootup.pack"
+        )
+        if slog_path.exists() and bootup_path.exists() and not force:
             with slog_path.open("r") as l_file:
                 if xxhash.xxh64_hexdigest(str(new_entries)) == l_file.read():
                     print("No savedata merging necessary.")
@@ -438,22 +548,13 @@ class SaveDataMerger(mergers.Merger):
         save_files = sorted(savedata.get_files(), key=lambda f: f.name)[0:-2]
 
         print("Merging changes...")
-        merged_entries = oead.byml.Array(
-            sorted(
-                {
-                    entry["HashValue"].v: entry
-                    for entry in [
-                        *[
-                            e
-                            for file in save_files
-                            for e in oead.byml.from_binary(file.data)["file_list"][1]
-                        ],
-                        *new_entries["add"],
-                    ]
-                    if entry not in new_entries["del"]
-                }.values(),
-                key=itemgetter("HashValue"),
-            )
+        merged_entries = merge_savedata_entries(
+            (
+                entry
+                for file in save_files
+                for entry in oead.byml.from_binary(file.data)["file_list"][1]
+            ),
+            new_entries["add"],
         )
         print("Creating and injecting new savedataformat.sarc...")
         new_savedata = oead.SarcWriter(
@@ -529,6 +630,10 @@ class SaveDataMerger(mergers.Merger):
         with slog_path.open("w", encoding="utf-8") as l_file:
             l_file.write(xxhash.xxh64_hexdigest(str(new_entries)))
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"packs"}
+
     def get_checkbox_options(self):
         return [("force", "Remerge save data even if no changes detected")]
 
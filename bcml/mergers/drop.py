@@ -73,7 +73,7 @@ def log_drop_file(file: str, mod_dir: Path):
         base_file = file[: file.index("//")]
         sub_file = file[file.index("//") :]
         ref_drop = ParameterIO.from_binary(
-            util.get_nested_file_bytes(str(util.get_game_file(base_file)) + sub_file)
+            util.get_stock_file_bytes(str(util.get_game_file(base_file)) + sub_file)
         )
         ref_table = _drop_to_dict(ref_drop)
         del ref_drop
@@ -99,13 +99,13 @@ def log_drop_file(file: str, mod_dir: Path):
     return {file: drop_table}
 
 
-def merge_drop_file(file: str, drop_table: dict):
+def merge_drop_file(file: str, drop_table: dict) -> (str, str, bytes):
     base_path = file[: file.index("//")]
     sub_path = file[file.index("//") :]
     try:
         ref_drop = _drop_to_dict(
             ParameterIO.from_binary(
-                util.get_nested_file_bytes(str(util.get_game_file(base_path)) + sub_path)
+                util.get_stock_file_bytes(str(util.get_game_file(base_path)) + sub_path)
             )
         )
         for table in set(ref_drop.keys()):
@@ -121,7 +121,7 @@ def merge_drop_file(file: str, drop_table: dict):
         pass
     actor_name = re.search(r"Pack\/(.+)\.sbactorpack", file).groups()[0]
     pio = _dict_to_drop(drop_table)
-    util.inject_files_into_actor(actor_name, {file.split("//")[-1]: pio.to_binary()})
+    return actor_name, file.split("//")[-1], pio.to_binary()
 
 
 class DropMerger(mergers.Merger):
@@ -188,12 +188,20 @@ class DropMerger(mergers.Merger):
             return
         print("Merging drop table edits...")
         pool = self._pool or Pool()
-        pool.starmap(merge_drop_file, diffs.items())
+        actor_files = {}
+        for actor, file, data in pool.starmap(merge_drop_file, diffs.items()):
+            actor_files.setdefault(actor, {})[file] = data
         if not self._pool:
             pool.close()
             pool.join()
+        for actor, files in actor_files.items():
+            util.inject_files_into_actor(actor, files)
         print("Finished merging drop tables")
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"packs"}
+
     def get_mod_edit_info(self, mod: util.BcmlMod):
         return set(self.get_mod_diff(mod).keys())
 
@@ -8,9 +8,11 @@ from bcml.mergers import rstable
 
 
 def get_stock_effects() -> oead.byml.Hash:
-    bootup_sarc = oead.Sarc(util.get_game_file("Pack/Bootup.pack").read_bytes())
     return oead.byml.from_binary(
-        util.decompress(bootup_sarc.get_file("Ecosystem/StatusEffectList.sbyml").data)
+        util.get_stock_file_bytes(
+            str(util.get_game_file("Pack/Bootup.pack"))
+            + "//Ecosystem/StatusEffectList.sbyml"
+        )
     )[0]
 
 
@@ -145,6 +147,10 @@ class StatusEffectMerger(mergers.Merger):
         del effect_bytes
         rstable.set_size("Ecosystem/StatusEffectList.byml", rstb_size)
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"packs"}
+
     def get_checkbox_options(self):
         return []
 
@@ -15,10 +15,9 @@ def get_stock_eventinfo() -> oead.byml.Hash:
     if not hasattr(get_stock_eventinfo, "event_info"):
         get_stock_eventinfo.event_info = oead.byml.to_text(
             oead.byml.from_binary(
-                util.get_nested_file_bytes(
+                util.get_stock_file_bytes(
                     str(util.get_game_file("Pack/Bootup.pack"))
-                    + "//Event/EventInfo.product.sbyml",
-                    unyaz=True,
+                    + "//Event/EventInfo.product.sbyml"
                 )
             )
         )
@@ -177,6 +176,10 @@ class EventInfoMerger(mergers.Merger):
         del event_bytes
         rstable.set_size("Event/EventInfo.product.byml", rstb_size)
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"packs"}
+
     def get_checkbox_options(self):
         return []
 
@@ -1,13 +1,14 @@
 from functools import reduce, partial
 from multiprocessing import Pool
 from pathlib import Path
-from typing import Union, List, ByteString
+from typing import Union, List, ByteString, Tuple
 
 from oead.aamp import ParameterIO, ParameterList, ParameterObject, Parameter
 from oead import Sarc, SarcWriter, InvalidDataError
 from bcml import util, mergers
 
 HANDLED = {".bdrop", ".bshop"}
+DEEP_MERGE_CHUNK = 64
 
 
 def get_aamp_diffs(file: str, tree: Union[dict, list], tmp_dir: Path) -> dict:
@@ -112,45 +113,87 @@ def merge_plists(
             plist.objects[key] = obj
 
 
-def merge_aamp_files(file: str, tree: dict):
+def _get_base_file(file: str) -> Path:
+    base_file = util.get_game_file(file)
+    if (util.get_master_modpack_dir() / file).exists():
+        base_file = util.get_master_modpack_dir() / file
+    return base_file
+
+
+def merge_aamp_files(file: str, tree: dict, merged: dict = None) -> str:
     try:
-        base_file = util.get_game_file(file)
+        base_file = _get_base_file(file)
     except FileNotFoundError:
         util.vprint(f"Skipping {file}, not found in dump")
-        return
-    if (util.get_master_modpack_dir() / file).exists():
-        base_file = util.get_master_modpack_dir() / file
+        return file
     sarc = Sarc(util.unyaz_if_needed(base_file.read_bytes()))
-    new_data = _merge_in_sarc(sarc, tree)
+    new_data = _merge_in_sarc(sarc, tree, merged)
     if base_file.suffix.startswith(".s") and base_file.suffix != ".ssarc":
         new_data = util.compress(new_data)
     (util.get_master_modpack_dir() / file).parent.mkdir(parents=True, exist_ok=True)
-    (util.get_master_modpack_dir() / file).write_bytes(new_data)
+    util.write_new_file(util.get_master_modpack_dir() / file, new_data)
+    return file
+
+
+def merge_aamp_entries(
+    task: Tuple[str, List[Tuple[str, Union[dict, ParameterList]]]]
+) -> (str, dict):
+    """
+    Merges a chunk of the nested SARCs or AAMP documents directly inside a
+    top-level file, so that the entries of a single large pack can be merged by
+    several workers
+    """
+    file, entries = task
+    try:
+        sarc = util.get_sarc_cache().get(_get_base_file(file))
+    except (FileNotFoundError, InvalidDataError, ValueError, RuntimeError):
+        return file, {name: None for name, _ in entries}
+    merged = {}
+    for name, stuff in entries:
+        data = _merge_sarc_entry(sarc, name, stuff)
+        merged[name] = bytes(data) if data is not None else None
+    return file, merged
+
+
+def _merge_sarc_entry(
+    sarc: Sarc, file: str, stuff: Union[dict, ParameterList]
+) -> Union[ByteString, None]:
+    if isinstance(stuff, dict):
+        try:
+            sub_sarc = Sarc(util.unyaz_if_needed(sarc.get_file(file).data))
+        except (InvalidDataError, ValueError, AttributeError, RuntimeError):
+            util.vprint(f"Couldn't merge into nested SARC {file}")
+            return None
+        nsub_bytes = _merge_in_sarc(sub_sarc, stuff)
+        return (
+            util.compress(nsub_bytes)
+            if file[file.rindex(".") :].startswith(".s")
+            else nsub_bytes
+        )
+    if isinstance(stuff, ParameterList):
+        try:
+            pio = ParameterIO.from_binary(sarc.get_file(file).data)
+        except (AttributeError, ValueError, InvalidDataError) as e:
+            util.vprint(f"Couldn't open {file}: {e}")
+            return None
+        merge_plists(pio, stuff)
+        return pio.to_binary()
+    return None
 
 
-def _merge_in_sarc(sarc: Sarc, edits: dict) -> ByteString:
+def _merge_in_sarc(sarc: Sarc, edits: dict, merged: dict = None) -> ByteString:
+    """
+    Merges edits into a SARC. Entries which were already merged elsewhere can be
+    passed in `merged`, with None for any that could not be merged.
+    """
     new_sarc = SarcWriter.from_sarc(sarc)
     for file, stuff in edits.items():
-        if isinstance(stuff, dict):
-            try:
-                sub_sarc = Sarc(util.unyaz_if_needed(sarc.get_file(file).data))
-            except (InvalidDataError, ValueError, AttributeError, RuntimeError):
-                util.vprint(f"Couldn't merge into nested SARC {file}")
-                continue
-            nsub_bytes = _merge_in_sarc(sub_sarc, stuff)
-            new_sarc.files[file] = (
-                util.compress(nsub_bytes)
-                if file[file.rindex(".") :].startswith(".s")
-                else nsub_bytes
-            )
-        elif isinstance(stuff, ParameterList):
-            try:
-                pio = ParameterIO.from_binary(sarc.get_file(file).data)
-            except (AttributeError, ValueError, InvalidDataError) as e:
-                util.vprint(f"Couldn't open {file}: {e}")
-                continue
-            merge_plists(pio, stuff)
-            new_sarc.files[file] = pio.to_binary()
+        if merged is not None and file in merged:
+            data = merged[file]
+        else:
+            data = _merge_sarc_entry(sarc, file, stuff)
+        if data is not None:
+            new_sarc.files[file] = data
     return new_sarc.write()[1]
 
 
@@ -268,12 +311,34 @@ class DeepMerger(mergers.Merger):
             print("No deep merge needed")
             return
         pool = self._pool or Pool()
-        pool.starmap(merge_aamp_files, diffs.items())
+        # Split the entries of large files across workers first, then rebuild,
+        # compress and write each file in a worker of its own
+        chunks = []
+        for file, tree in diffs.items():
+            if len(tree) > DEEP_MERGE_CHUNK:
+                entries = list(tree.items())
+                chunks.extend(
+                    (file, entries[i : i + DEEP_MERGE_CHUNK])
+                    for i in range(0, len(entries), DEEP_MERGE_CHUNK)
+                )
+        merged = {}
+        for file, entries in util.timed_map(pool, merge_aamp_entries, chunks, 1):
+            merged.setdefault(file, {}).update(entries)
+        util.timed_starmap(
+            pool,
+            merge_aamp_files,
+            [(file, tree, merged.get(file)) for file, tree in diffs.items()],
+            1,
+        )
         if not self._pool:
             pool.close()
             pool.join()
         print("Finished deep merge")
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"packs"}
+
     def get_checkbox_options(self):
         return []
 
@@ -51,47 +51,43 @@ def get_stock_map(map_unit: Union[Map, tuple], force_vanilla: bool = False) -> H
                     util.get_game_dir() / "Map/MainField/"
                     f"{map_unit.section}/{map_unit.section}_{map_unit.type}.smubin"
                 )
-            map_bytes = map_path.read_bytes()
+            map_bytes = util.get_stock_file_bytes(str(map_path))
         except FileNotFoundError:
             try:
-                title_pack = oead.Sarc(
-                    util.get_game_file("Pack/TitleBG.pack").read_bytes()
+                map_bytes = util.get_stock_file_bytes(
+                    str(util.get_game_file("Pack/TitleBG.pack"))
+                    + f"//Map/MainField/{map_unit.section}/"
+                    f"{map_unit.section}_{map_unit.type}.smubin"
                 )
-                map_bytes = title_pack.get_file(
-                    f"Map/MainField/{map_unit.section}/{map_unit.section}_{map_unit.type}"
-                    ".smubin"
-                ).data
             except (KeyError, RuntimeError, AttributeError):
                 map_bytes = None
     else:
         if (aoc_dir / "Pack" / "AocMainField.pack").exists():
             try:
-                map_pack = oead.Sarc(
-                    (aoc_dir / "Pack" / "AocMainField.pack").read_bytes()
+                map_bytes = util.get_stock_file_bytes(
+                    str(aoc_dir / "Pack" / "AocMainField.pack")
+                    + f"//Map/MainField/{map_unit.section}/"
+                    f"{map_unit.section}_{map_unit.type}.smubin"
                 )
-                map_bytes = map_pack.get_file(
-                    f"Map/MainField/{map_unit.section}/{map_unit.section}_{map_unit.type}"
-                    ".smubin"
-                ).data
             except (KeyError, RuntimeError, AttributeError):
                 map_bytes = None
         if not map_bytes:
             map_path = f"Map/MainField/{map_unit.section}/{map_unit.section}_{map_unit.type}.smubin"
             try:
-                map_bytes = util.get_game_file(map_path, aoc=True).read_bytes()
+                map_bytes = util.get_stock_file_bytes(
+                    str(util.get_game_file(map_path, aoc=True))
+                )
             except FileNotFoundError:
                 try:
-                    map_bytes = util.get_game_file(map_path).read_bytes()
+                    map_bytes = util.get_stock_file_bytes(
+                        str(util.get_game_file(map_path))
+                    )
                 except FileNotFoundError:
                     try:
-                        title_pack = oead.Sarc(
-                            util.get_game_file("Pack/TitleBG.pack").read_bytes()
-                        )
-                        map_bytes = bytes(
-                            title_pack.get_file(
-                                f"Map/MainField/{map_unit.section}/"
-                                f"{map_unit.section}_{map_unit.type}.smubin"
-                            ).data
+                        map_bytes = util.get_stock_file_bytes(
+                            str(util.get_game_file("Pack/TitleBG.pack"))
+                            + f"//Map/MainField/{map_unit.section}/"
+                            f"{map_unit.section}_{map_unit.type}.smubin"
                         )
                     except (KeyError, RuntimeError, AttributeError):
                         map_bytes = None
@@ -99,7 +95,6 @@ def get_stock_map(map_unit: Union[Map, tuple], force_vanilla: bool = False) -> H
         raise FileNotFoundError(
             f"The stock map file {map_unit.section}_{map_unit.type}.smubin could not be found."
         )
-    map_bytes = util.decompress(map_bytes)
     return oead.byml.from_binary(map_bytes)
 
 
@@ -182,8 +177,17 @@ def get_map_diff(
             stock_map = False
             break
     base_map = get_stock_map(map_unit, force_vanilla=stock_map)
+    diffs = diff_map_objs(base_map, mod_map, no_del=no_del, link_del=link_del)
+    del mod_map
+    del base_map
+    return "_".join(map_unit), oead.byml.to_text(diffs)
 
-    base_hashes = [int(obj["HashId"]) for obj in base_map["Objs"]]
+
+def diff_map_objs(
+    base_map: Hash, mod_map: Hash, no_del: bool = False, link_del: bool = False
+) -> Hash:
+    # Keep the first object for any duplicated HashId, as list.index() did
+    base_objs = {int(obj["HashId"]): obj for obj in reversed(base_map["Objs"])}
     base_links = (
         set()
         if link_del
@@ -194,34 +198,26 @@ def get_map_diff(
             if "LinksToObj" in obj
         }
     )
-    mod_hashes = [int(obj["HashId"]) for obj in mod_map["Objs"]]
+    kept_hashes = {int(obj["HashId"]) for obj in mod_map["Objs"]} | base_links
 
     diffs = Hash()
     diffs["add"] = Array(
-        {obj for obj in mod_map["Objs"] if int(obj["HashId"]) not in base_hashes}
+        {obj for obj in mod_map["Objs"] if int(obj["HashId"]) not in base_objs}
     )
     diffs["mod"] = Hash(
         {
             str(obj["HashId"]): obj
             for obj in mod_map["Objs"]
-            if int(obj["HashId"]) in base_hashes
-            and obj != base_map["Objs"][base_hashes.index(int(obj["HashId"]))]
+            if int(obj["HashId"]) in base_objs
+            and obj != base_objs[int(obj["HashId"])]
         }
     )
     diffs["del"] = Array(
-        {
-            oead.U32(hash_id)
-            for hash_id in base_hashes
-            if hash_id not in {*mod_hashes, *base_links}
-        }
+        {oead.U32(hash_id) for hash_id in base_objs if hash_id not in kept_hashes}
         if not no_del
         else set()
     )
-    del mod_map
-    del base_map
-    del base_links
-    del mod_hashes
-    return "_".join(map_unit), oead.byml.to_text(diffs)
+    return diffs
 
 
 def generate_modded_map_log(
@@ -248,47 +244,40 @@ def generate_modded_map_log(
     return diffs
 
 
+def merge_map_objs(objs: Array, changes: Hash, no_del: bool = False) -> list:
+    stock_indexes = {}
+    for i, obj in enumerate(objs):
+        stock_indexes.setdefault(int(obj["HashId"]), i)
+    objs = list(objs)
+    for hash_id, actor in changes["mod"].items():
+        try:
+            objs[stock_indexes[int(hash_id)]] = actor
+        except KeyError:
+            changes["add"].append(actor)
+    if not no_del:
+        del_indexes = {
+            stock_indexes[int(map_del)]
+            for map_del in changes["del"]
+            if int(map_del) in stock_indexes
+        }
+        objs = [obj for i, obj in enumerate(objs) if i not in del_indexes]
+    objs.extend(
+        [
+            change
+            for change in changes["add"]
+            if int(change["HashId"]) not in stock_indexes
+        ]
+    )
+    return sorted(objs, key=lambda actor: int(actor["HashId"]))
+
+
 def merge_map(
     map_pair: tuple, rstb_calc: rstb.SizeCalculator, no_del: bool = False
 ) -> {}:
     map_unit, changes = map_pair[0], map_pair[1]
     util.vprint(f'Merging {len(changes)} versions of {"_".join(map_unit)}...')
     new_map = get_stock_map(map_unit)
-    stock_hashes = [int(obj["HashId"]) for obj in new_map["Objs"]]
-    for hash_id, actor in changes["mod"].items():
-        try:
-            new_map["Objs"][stock_hashes.index(int(hash_id))] = actor
-        except ValueError:
-            changes["add"].append(actor)
-    if not no_del:
-        for map_del in sorted(
-            changes["del"],
-            key=lambda change: stock_hashes.index(int(change))
-            if int(change) in stock_hashes
-            else -1,
-            reverse=True,
-        ):
-            if int(map_del) in stock_hashes:
-                try:
-                    new_map["Objs"].pop(stock_hashes.index(int(map_del)))
-                except IndexError:
-                    try:
-                        obj_to_delete = next(
-                            iter(
-                                [
-                                    actor
-                                    for actor in new_map["Objs"]
-                                    if actor["HashId"] == map_del
-                                ]
-                            )
-                        )
-                        new_map["Objs"].remove(obj_to_delete)
-                    except (StopIteration, ValueError):
-                        util.vprint(f"Could not delete actor with HashId {map_del}")
-    new_map["Objs"].extend(
-        [change for change in changes["add"] if int(change["HashId"]) not in stock_hashes]
-    )
-    new_map["Objs"] = sorted(new_map["Objs"], key=lambda actor: int(actor["HashId"]))
+    new_map["Objs"] = merge_map_objs(new_map["Objs"], changes, no_del=no_del)
 
     aoc_out: Path = (
         util.get_master_modpack_dir()
@@ -367,7 +356,17 @@ def get_dungeonstatic_diff(file: Path) -> dict:
 
 def merge_dungeonstatic(diffs: dict = None):
     """Merges all changes to the CDungeon Static.smubin"""
+    output_static = (
+        util.get_master_modpack_dir()
+        / util.get_dlc_path()
+        / ("0010" if util.get_settings("wiiu") else "")
+        / "Map"
+        / "CDungeon"
+        / "Static.smubin"
+    )
     if not diffs:
+        if output_static.exists():
+            output_static.unlink()
         return
 
     new_static = oead.byml.from_binary(
@@ -384,14 +383,6 @@ def merge_dungeonstatic(diffs: dict = None):
             for key, value in diff.items():
                 new_static["StartPos"][base_dungeons.index(dungeon)][key] = value
 
-    output_static = (
-        util.get_master_modpack_dir()
-        / util.get_dlc_path()
-        / ("0010" if util.get_settings("wiiu") else "")
-        / "Map"
-        / "CDungeon"
-        / "Static.smubin"
-    )
     output_static.parent.mkdir(parents=True, exist_ok=True)
     output_static.write_bytes(
         util.compress(
@@ -486,13 +477,11 @@ class MapMerger(mergers.Merger):
             for mod in mods:
                 for hash_id, actor in mod["mod"].items():
                     c_diffs[file]["mod"][hash_id] = actor
-            add_hashes = []
+            add_hashes = set()
             for mod in reversed(mods):
-                if file == Map("D-6", "Static"):
-                    print("Hello")
                 for actor in mod["add"]:
-                    if actor["HashId"] not in add_hashes:
-                        add_hashes.append(actor["HashId"])
+                    if int(actor["HashId"]) not in add_hashes:
+                        add_hashes.add(int(actor["HashId"]))
                         c_diffs[file]["add"].append(actor)
         return c_diffs
 
@@ -509,7 +498,7 @@ class MapMerger(mergers.Merger):
         if not aoc_pack.exists() or aoc_pack.stat().st_size > 0:
             print("Emptying AocMainField.pack...")
             aoc_pack.parent.mkdir(parents=True, exist_ok=True)
-            aoc_pack.write_bytes(b"")
+            util.write_new_file(aoc_pack, b"")
         shutil.rmtree(
             str(
                 util.get_master_modpack_dir()
@@ -545,8 +534,10 @@ class MapMerger(mergers.Merger):
         print("Merging modded map units...")
 
         pool = self._pool or Pool()
-        rstb_results = pool.map(
-            partial(merge_map, rstb_calc=rstb_calc, no_del=no_del), map_diffs.items(),
+        rstb_results = util.timed_map(
+            pool,
+            partial(merge_map, rstb_calc=rstb_calc, no_del=no_del),
+            map_diffs.items(),
         )
         for result in rstb_results:
             rstb_vals[result[util.get_dlc_path()][0]] = result[util.get_dlc_path()][1]
@@ -562,6 +553,10 @@ class MapMerger(mergers.Merger):
                 l_file.write(f"{canon},{val}\n")
         print("Map merge complete")
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"packs"}
+
     def get_checkbox_options(self):
         return [
             ("no_del", "Never remove stock actors from merged maps"),
@@ -3,13 +3,18 @@
 # Copyright 2020 Nicene Nerd <macadamiadaze@gmail.com>
 # Licensed under GPLv3+
 import json
+import os
+import threading
+from functools import lru_cache
 from multiprocessing import Pool
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, List, Union
 
 import oead
+import xxhash
 
 from bcml import util, mergers
+from bcml.__version__ import VERSION
 
 SPECIAL = {
     "GameData/gamedata.ssarc",
@@ -21,6 +26,53 @@ SPECIAL = {
 EXCLUDE_EXTS = {".sbeventpack"}
 
 
+@lru_cache(None)
+def get_pack_cache_dir() -> Path:
+    cache_dir = util.get_data_dir() / "pack_cache"
+    if not cache_dir.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def get_pack_manifest() -> Dict[str, str]:
+    """Gets the cache key each merged SARC was last built from"""
+    try:
+        return json.loads(
+            (get_pack_cache_dir() / "manifest.json").read_text(encoding="utf-8")
+        )
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_pack_manifest(manifest: Dict[str, str]):
+    manifest_path = get_pack_cache_dir() / "manifest.json"
+    tmp_path = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp_path, manifest_path)
+    for cached in get_pack_cache_dir().glob("*.bin"):
+        if cached.stem not in manifest.values():
+            cached.unlink()
+
+
+def get_pack_key(file_name: str, sources: List[Path]) -> str:
+    """
+    Gets a cache key for a merged SARC from the files which go into it, in priority
+    order, along with the settings, BCML version and hash table which change the
+    merged output
+    """
+    parts = [
+        file_name,
+        VERSION,
+        util.get_hash_table_id(util.get_settings("wiiu")),
+        str(util.get_settings("wiiu")),
+        str(util.get_settings("compress_level")),
+    ]
+    for source in sources:
+        stat = source.stat()
+        parts.append(f"{source.as_posix()}|{stat.st_mtime_ns}|{stat.st_size}")
+    return xxhash.xxh64_hexdigest("//".join(parts))
+
+
 def merge_sarcs(file_name: str, sarcs: List[Union[Path, bytes]]) -> (str, bytes):
     opened_sarcs: List[oead.Sarc] = []
     if "Bootup.pack" in file_name:
@@ -29,15 +81,20 @@ def merge_sarcs(file_name: str, sarcs: List[Union[Path, bytes]]) -> (str, bytes)
         for i, sarc_path in enumerate(sarcs):
             sarcs[i] = sarc_path.read_bytes()
     for sarc_bytes in sarcs:
-        sarc_bytes = util.unyaz_if_needed(sarc_bytes)
+        sarc_bytes = util.unyaz_if_needed(sarc_bytes, copy=False)
         try:
             opened_sarcs.append(oead.Sarc(sarc_bytes))
         except (ValueError, RuntimeError, oead.InvalidDataError):
             continue
 
-    all_files = {
-        file.name for open_sarc in opened_sarcs for file in open_sarc.get_files()
-    }
+    # Plan the merge once: each SARC's entries by name, highest priority first, and
+    # each canonical name's known stock hashes, so every entry is hashed only once
+    layers = [
+        {file.name: file.data for file in open_sarc.get_files()}
+        for open_sarc in reversed(opened_sarcs)
+    ]
+    all_files = dict.fromkeys(name for layer in reversed(layers) for name in layer)
+    table = util.get_hash_table(util.get_settings("wiiu"))
     nested_sarcs = {}
     new_sarc = oead.SarcWriter(
         endian=oead.Endianness.Big
@@ -45,23 +102,28 @@ def merge_sarcs(file_name: str, sarcs: List[Union[Path, bytes]]) -> (str, bytes)
         else oead.Endianness.Little
     )
     files_added = set()
+    sarc_exts = util.SARC_EXTS - EXCLUDE_EXTS
 
-    for opened_sarc in reversed(opened_sarcs):
-        for file in [f for f in opened_sarc.get_files() if f.name not in files_added]:
-            file_data = oead.Bytes(file.data)
-            if util.is_file_modded(
-                file.name.replace(".s", "."), file_data, count_new=True
-            ):
-                if (
-                    not file.name[file.name.rindex(".") :]
-                    in util.SARC_EXTS - EXCLUDE_EXTS
-                ) or file.name in SPECIAL:
-                    new_sarc.files[file.name] = file_data
-                    files_added.add(file.name)
-                else:
-                    if file.name not in nested_sarcs:
-                        nested_sarcs[file.name] = []
-                    nested_sarcs[file.name].append(util.unyaz_if_needed(file_data))
+    for name in all_files:
+        canon = name.replace(".s", ".")
+        stock_hashes = table.get(canon)
+        is_nested = Path(name).suffix in sarc_exts and name not in SPECIAL
+        for layer in layers:
+            # Entries stay views of the opened SARCs until the new one is written
+            file_data = layer.get(name)
+            if file_data is None:
+                continue
+            if stock_hashes is not None:
+                contents = util.unyaz_if_needed(file_data, copy=False)
+                if xxhash.xxh64_intdigest(contents) in stock_hashes:
+                    continue
+            elif is_nested:
+                contents = util.unyaz_if_needed(file_data, copy=False)
+            if not is_nested:
+                new_sarc.files[name] = file_data
+                files_added.add(name)
+                break
+            nested_sarcs.setdefault(name, []).append(contents)
     util.vprint(set(nested_sarcs.keys()))
     for file, sarcs in nested_sarcs.items():
         if not sarcs:
@@ -72,13 +134,10 @@ def merge_sarcs(file_name: str, sarcs: List[Union[Path, bytes]]) -> (str, bytes)
         new_sarc.files[file] = merged_bytes
         files_added.add(file)
     for file in [file for file in all_files if file not in files_added]:
-        for opened_sarc in [
-            open_sarc
-            for open_sarc in opened_sarcs
-            if (file in [f.name for f in open_sarc.get_files()])
-        ]:
-            new_sarc.files[file] = oead.Bytes(opened_sarc.get_file(file).data)
-            break
+        for layer in reversed(layers):
+            if file in layer:
+                new_sarc.files[file] = layer[file]
+                break
 
     if "Bootup.pack" in file_name:
         for merger in [
@@ -104,6 +163,10 @@ class PackMerger(mergers.Merger):
     def can_partial_remerge(self):
         return True
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"aamp", "drops", "shop"}
+
     def get_mod_affected(self, mod):
         return self.get_mod_diff(mod)
 
@@ -203,19 +266,67 @@ class PackMerger(mergers.Merger):
         if not sarcs:
             print("No SARC merging necessary")
             return
-        print(f"Merging {len(sarcs)} SARC files...")
-        pool = self._pool or Pool()
-        results = pool.starmap(merge_sarcs, sarcs.items())
-        for result in results:
-            file, file_data = result
+
+        # Bootup.pack also carries injections from other mergers, so it is always
+        # rebuilt; any other SARC is reused if none of its sources have changed
+        old_manifest = get_pack_manifest()
+        manifest = dict(old_manifest) if "only_these" in self._options else {}
+        keys = {
+            file: get_pack_key(file, sources)
+            for file, sources in sarcs.items()
+            if "Bootup.pack" not in file
+        }
+        cached = {
+            file
+            for file, key in keys.items()
+            if old_manifest.get(file) == key
+            and (get_pack_cache_dir() / f"{key}.bin").exists()
+        }
+        rebuilt = {file: srcs for file, srcs in sarcs.items() if file not in cached}
+        print(
+            f"Merging {len(rebuilt)} SARC files, "
+            f"reusing {len(cached)} unchanged merges..."
+        )
+        results = {}
+        linked = set(cached)
+        if rebuilt:
+            pool = self._pool or Pool()
+            results = dict(util.timed_starmap(pool, merge_sarcs, rebuilt.items()))
+            yazd = [file for file in results if Path(file).suffix.startswith(".s")]
+            for file, file_data in zip(
+                yazd, util.compress_many([results[file] for file in yazd], pool)
+            ):
+                results[file] = file_data
+            if not self._pool:
+                pool.close()
+                pool.join()
+            for file in set(results) & keys.keys():
+                cache_path = get_pack_cache_dir() / f"{keys[file]}.bin"
+                tmp_path = cache_path.with_suffix(
+                    f".{os.getpid()}.{threading.get_ident()}.tmp"
+                )
+                tmp_path.write_bytes(results.pop(file))
+                os.replace(tmp_path, cache_path)
+                linked.add(file)
+        for file, file_data in results.items():
             output_path = util.get_master_modpack_dir() / file
             output_path.parent.mkdir(parents=True, exist_ok=True)
-            if output_path.suffix.startswith(".s"):
-                file_data = util.compress(file_data)
-            output_path.write_bytes(file_data)
-        if not self._pool:
-            pool.close()
-            pool.join()
+            util.write_new_file(output_path, file_data)
+        # Cached merges are hardlinked into the master mod, so each is stored once.
+        # Anything which edits a master file later writes it as a new file.
+        outputs = [
+            (
+                get_pack_cache_dir() / f"{keys[file]}.bin",
+                util.get_master_modpack_dir() / file,
+            )
+            for file in linked
+        ]
+        for _, output_path in outputs:
+            if output_path.exists():
+                output_path.unlink()
+        util.transfer_files(outputs, link=True)
+        manifest.update(keys)
+        save_pack_manifest(manifest)
         print("Finished merging SARCs")
 
     def get_checkbox_options(self):
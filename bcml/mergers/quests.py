@@ -7,9 +7,11 @@ from bcml import mergers, util
 
 
 def get_stock_quests() -> oead.byml.Array:
-    title_sarc = oead.Sarc(util.get_game_file("Pack/TitleBG.pack").read_bytes())
     return oead.byml.from_binary(
-        util.decompress(title_sarc.get_file("Quest/QuestProduct.sbquestpack").data)
+        util.get_stock_file_bytes(
+            str(util.get_game_file("Pack/TitleBG.pack"))
+            + "//Quest/QuestProduct.sbquestpack"
+        )
     )
 
 
@@ -161,6 +163,10 @@ class QuestMerger(mergers.Merger):
             create_sarc=True,
         )
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"packs"}
+
     def get_mod_edit_info(self, mod: util.BcmlMod) -> set:
         diff = self.consolidate_diffs(self.get_mod_diff(mod))
         if not diff:
@@ -5,9 +5,11 @@
 import json
 import io
 import math
+import os
 import struct
+from contextlib import AbstractContextManager
 from copy import deepcopy
-from functools import partial, reduce
+from functools import partial, reduce, lru_cache
 from multiprocessing import Pool
 from pathlib import Path
 from typing import List, Union, ByteString, Dict
@@ -15,6 +17,7 @@ from typing import List, Union, ByteString, Dict
 # pylint: disable=wrong-import-order
 import oead
 import rstb
+import xxhash
 from botw.rstb import guess_aamp_size, guess_bfres_size
 from rstb.util import read_rstb
 
@@ -45,6 +48,34 @@ SARC_EXCLUDES = {
     ".bfarc",
     ".sbfarc",
 }
+SIZE_CACHE_MAX = 20000
+
+
+@lru_cache(2)
+def get_size_cache(wiiu: bool) -> Dict[str, list]:
+    """
+    Gets the persistent cache of master file sizes, keyed by file contents. Only the
+    merging process loads it; pool workers just calculate sizes and hand them back.
+    """
+    try:
+        return json.loads(_get_size_cache_path(wiiu).read_text("utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _get_size_cache_path(wiiu: bool) -> Path:
+    return util.get_data_dir() / f'rstb_sizes_{"wiiu" if wiiu else "switch"}.json'
+
+
+def save_size_cache(wiiu: bool, new_sizes: Dict[str, list]):
+    cache = get_size_cache(wiiu)
+    cache.update(new_sizes)
+    for key in list(cache)[: max(len(cache) - SIZE_CACHE_MAX, 0)]:
+        del cache[key]
+    cache_path = _get_size_cache_path(wiiu)
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(cache), encoding="utf-8")
+    os.replace(tmp_path, cache_path)
 
 
 def calculate_size(
@@ -81,7 +112,11 @@ def calculate_size(
         return 0
 
 
-def get_stock_rstb() -> rstb.ResourceSizeTable:
+def get_stock_rstb(copy: bool = True) -> rstb.ResourceSizeTable:
+    """
+    Gets the stock RSTB. Pass `copy=False` to get the shared table itself, which
+    must then not be modified.
+    """
     if not hasattr(get_stock_rstb, "table"):
         get_stock_rstb.table = read_rstb(
             str(
@@ -91,17 +126,108 @@ def get_stock_rstb() -> rstb.ResourceSizeTable:
             ),
             util.get_settings("wiiu"),
         )
-    return deepcopy(get_stock_rstb.table)
+    return deepcopy(get_stock_rstb.table) if copy else get_stock_rstb.table
 
 
-def set_size(entry: str, size: int):
-    rstb_path = (
+def get_master_rstb_path() -> Path:
+    return (
         util.get_master_modpack_dir()
         / util.get_content_path()
         / "System"
         / "Resource"
         / "ResourceSizeTable.product.srsizetable"
     )
+
+
+class RstbOverlay(AbstractContextManager):
+    """
+    A copy-on-write view of the stock RSTB. Lookups fall through to the shared stock
+    table while edits are kept in a small dict, so the full table is only copied
+    once, when it is written.
+
+    While open as a context manager it collects every `set_size` call, and it saves
+    the master RSTB on exit if anything was changed. Pass `master=True` to layer the
+    edits over the current master RSTB rather than the stock one.
+    """
+
+    active = None
+
+    def __init__(self, master: bool = False):
+        rstb_path = get_master_rstb_path()
+        if master and rstb_path.exists():
+            self._base = read_rstb(rstb_path, be=util.get_settings("wiiu"))
+            self._owned = True
+        else:
+            self._base = get_stock_rstb(copy=False)
+            self._owned = False
+        self._sizes: Dict[str, int] = {}
+        self._deleted = set()
+        self.dirty = False
+
+    def __enter__(self):
+        RstbOverlay.active = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None and self.dirty:
+                self.save()
+        finally:
+            RstbOverlay.active = None
+
+    def rebase(self):
+        """Layers the pending edits over the stock RSTB instead of the master one"""
+        self._base = get_stock_rstb(copy=False)
+        self._owned = False
+
+    def is_in_table(self, name: str) -> bool:
+        if name in self._deleted:
+            return False
+        return name in self._sizes or self._base.is_in_table(name)
+
+    def get_size(self, name: str) -> int:
+        if name in self._sizes:
+            return self._sizes[name]
+        if name in self._deleted:
+            return 0
+        return self._base.get_size(name)
+
+    def set_size(self, name: str, size: int):
+        self._sizes[name] = size
+        self._deleted.discard(name)
+        self.dirty = True
+
+    def delete_entry(self, name: str):
+        self._sizes.pop(name, None)
+        self._deleted.add(name)
+        self.dirty = True
+
+    def to_table(self) -> rstb.ResourceSizeTable:
+        table = self._base if self._owned else deepcopy(self._base)
+        for name in self._deleted:
+            if table.is_in_table(name):
+                table.delete_entry(name)
+        for name, size in self._sizes.items():
+            table.set_size(name, size)
+        return table
+
+    def write(self, stream: io.BytesIO, be: bool):  # pylint: disable=invalid-name
+        self.to_table().write(stream, be)
+
+    def save(self):
+        rstb_path = get_master_rstb_path()
+        rstb_path.parent.mkdir(parents=True, exist_ok=True)
+        with io.BytesIO() as buf:
+            self.write(buf, util.get_settings("wiiu"))
+            rstb_path.write_bytes(util.compress(buf.getvalue()))
+        self.dirty = False
+
+
+def set_size(entry: str, size: int):
+    if RstbOverlay.active:
+        RstbOverlay.active.set_size(entry, size)
+        return
+    rstb_path = get_master_rstb_path()
     if rstb_path.exists():
         table = read_rstb(rstb_path, be=util.get_settings("wiiu"))
     else:
@@ -113,11 +239,7 @@ def set_size(entry: str, size: int):
     rstb_path.write_bytes(util.compress(buf.getvalue()))
 
 
-def _get_modded_file_size(file: Path, mod_dir: Path, guess: bool) -> Dict[str, int]:
-    try:
-        canon = util.get_canon_name(file.relative_to(mod_dir).as_posix())
-    except ValueError:
-        return {}
+def _get_modded_file_size(file: Path, canon: str, guess: bool) -> Dict[str, int]:
     if file.suffix not in EXCLUDE_EXTS and canon not in EXCLUDE_NAMES:
         return {
             canon: calculate_size(
@@ -146,7 +268,7 @@ def _get_nest_file_sizes(
                 ext = subpath[subpath.rindex(".") :]
                 if ext in EXCLUDE_EXTS:
                     continue
-                data = util.unyaz_if_needed(sarc.get_file(subpath).data)
+                data = util.unyaz_if_needed(sarc.get_file(subpath).data, copy=False)
                 canon = prefix + subpath.replace(".s", ".")
                 vals[canon] = calculate_size(canon, data, guess)
                 if ext not in SARC_EXCLUDES:
@@ -167,6 +289,33 @@ def _get_nest_file_sizes(
     return vals
 
 
+def _hash_master_file(file: Path) -> str:
+    return xxhash.xxh64_hexdigest(file.read_bytes())
+
+
+def _get_master_file_sizes(
+    file: Path, canon: str, guess: bool, sarc_guess: bool
+) -> (Dict[str, int], Dict[str, int]):
+    """
+    Gets the sizes of a master mod file and, for SARCs, of the modified files in it,
+    decompressing it only once
+    """
+    data = util.unyaz_if_needed(file.read_bytes())
+    sizes = {}
+    if file.suffix not in EXCLUDE_EXTS and canon not in EXCLUDE_NAMES:
+        sizes[canon] = calculate_size(
+            file.name, data, guess=guess or file.suffix in {".bas", ".baslist"}
+        )
+    nested_sizes = {}
+    if file.suffix in util.SARC_EXTS - SARC_EXCLUDES:
+        try:
+            nested_sizes = _get_sizes_in_sarc(oead.Sarc(data), sarc_guess)
+        except (ValueError, RuntimeError, oead.InvalidDataError):
+            print(f"{file} could not be opened")
+    del data
+    return sizes, nested_sizes
+
+
 def _get_sizes_in_sarc(
     file: Union[Path, oead.Sarc], guess: bool, is_aoc: bool = False
 ) -> {}:
@@ -232,7 +381,7 @@ class RstbMerger(mergers.Merger):
         diff = {}
         nested_files = {}
         if not self._table:
-            self._table = get_stock_rstb()
+            self._table = RstbOverlay()
         pool = self._pool or Pool()
         for nest in {n for n in modded_files if isinstance(n, str)}:
             util.dict_merge(
@@ -246,13 +395,14 @@ class RstbMerger(mergers.Merger):
         diff.update(
             {
                 k: v
-                for r in pool.map(
+                for r in pool.starmap(
                     partial(
                         _get_modded_file_size,
-                        mod_dir=mod_dir,
                         guess=not self._options.get("no_guess", False),
                     ),
-                    {f for f in modded_files if isinstance(f, Path)},
+                    util.get_canon_names(
+                        {f for f in modded_files if isinstance(f, Path)}, mod_dir
+                    ).items(),
                 )
                 for k, v in r.items()
                 if r is not None and not self.should_exclude(k, v)
@@ -312,6 +462,10 @@ class RstbMerger(mergers.Merger):
             all_diffs.update(diff)
         return all_diffs
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {m.NAME for m in mergers.get_mergers()} - {RstbMerger.NAME}
+
     def get_checkbox_options(self) -> List[tuple]:
         return [
             ("no_guess", "Don't estimate RSTB values for AAMP and BFRES files"),
@@ -320,44 +474,61 @@ class RstbMerger(mergers.Merger):
     @util.timed
     def perform_merge(self):
         pool = self._pool or Pool()
-        if not self._table:
-            self._table = get_stock_rstb()
+        # Build on the sizes other mergers set during this refresh, if any
+        self._table = RstbOverlay.active or RstbOverlay()
+        self._table.rebase()
         diffs = self.consolidate_diffs(self.get_all_diffs())
         master = util.get_master_modpack_dir()
         master_files = {
-            f for f in master.rglob("**/*") if f.is_file() and "logs" not in f.parts
+            f
+            for f in master.rglob("**/*")
+            if f.is_file()
+            and "logs" not in f.parts
+            and (
+                f.suffix not in EXCLUDE_EXTS or f.suffix in util.SARC_EXTS - SARC_EXCLUDES
+            )
         }
-        diffs.update(
-            {
-                k: v
-                for r in pool.map(
+        wiiu = util.get_settings("wiiu")
+        guess = not self._options.get("no_guess", False)
+        sarc_guess = not util.get_settings("no_guess")
+        canons = list(util.get_canon_names(master_files, master).items())
+        # Sizes depend only on the contents, the name, the guess settings and, for
+        # files nested in SARCs, on which of them the hash table counts as modded
+        key_suffix = f"|{int(guess)}|{int(sarc_guess)}|{util.get_hash_table_id(wiiu)}"
+        keys = [
+            f"{digest}|{canon}{key_suffix}"
+            for digest, (_, canon) in zip(
+                pool.map(_hash_master_file, [file for file, _ in canons]), canons
+            )
+        ]
+        cache = get_size_cache(wiiu)
+        misses = [(key, item) for key, item in zip(keys, canons) if key not in cache]
+        new_sizes = dict(
+            zip(
+                [key for key, _ in misses],
+                pool.starmap(
                     partial(
-                        _get_modded_file_size,
-                        mod_dir=master,
-                        guess=not self._options.get("no_guess", False),
+                        _get_master_file_sizes, guess=guess, sarc_guess=sarc_guess
                     ),
-                    {f for f in master_files if f.suffix not in EXCLUDE_EXTS},
-                )
-                for k, v in r.items()
-                if r is not None and not self.should_exclude(k, v)
-            }
-        )
-
-        diffs.update(
-            {
-                k: v
-                for r in pool.map(
-                    partial(_get_sizes_in_sarc, guess=not util.get_settings("no_guess"),),
-                    {
-                        f
-                        for f in master_files
-                        if f.suffix in util.SARC_EXTS - SARC_EXCLUDES
-                    },
-                )
-                for k, v in r.items()
-                if r is not None and not self.should_exclude(k, v)
-            }
+                    [item for _, item in misses],
+                ),
+            )
         )
+        if not self._pool:
+            pool.close()
+            pool.join()
+        file_sizes = {}
+        nested_sizes = {}
+        for key in keys:
+            sizes, nested = new_sizes[key] if key in new_sizes else cache[key]
+            file_sizes.update(sizes)
+            nested_sizes.update(nested)
+        if new_sizes:
+            save_size_cache(wiiu, new_sizes)
+        for sizes in (file_sizes, nested_sizes):
+            diffs.update(
+                {k: v for k, v in sizes.items() if not self.should_exclude(k, v)}
+            )
         table = self._table
         for canon, size in diffs.copy().items():
             if size == 0:
@@ -373,17 +544,11 @@ class RstbMerger(mergers.Merger):
         if table.is_in_table(f"Message/Msg_{util.get_settings('lang')}.product.sarc"):
             table.delete_entry(f"Message/Msg_{util.get_settings('lang')}.product.sarc")
 
-        out = (
-            master
-            / util.get_content_path()
-            / "System"
-            / "Resource"
-            / "ResourceSizeTable.product.srsizetable"
-        )
-        out.parent.mkdir(parents=True, exist_ok=True)
-        with io.BytesIO() as buf:
-            table.write(buf, util.get_settings("wiiu"))
-            out.write_bytes(util.compress(buf.getvalue()))
+        if table is RstbOverlay.active:
+            # Saved once when the refresh closes the overlay
+            table.dirty = True
+        else:
+            table.save()
 
         log = master / "logs" / "rstb.json"
         log.parent.mkdir(parents=True, exist_ok=True)
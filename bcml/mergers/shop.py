@@ -278,10 +278,8 @@ def threaded_merge(item) -> Tuple[str, dict]:
 
     new_bytes = new_bytes if not yazd else util.compress(new_bytes)
     output_file = util.get_master_modpack_dir() / file
-    if base_file == output_file:
-        output_file.unlink()
     output_file.parent.mkdir(parents=True, exist_ok=True)
-    output_file.write_bytes(new_bytes)
+    util.write_new_file(output_file, new_bytes)
     del new_bytes
     if magic == b"SARC":
         util.vprint(f"Finished patching files inside {file}")
@@ -374,6 +372,10 @@ class ShopMerger(mergers.Merger):
             util.dict_merge(consolidated_diffs, nest)
         return consolidated_diffs
 
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"packs"}
+
     @staticmethod
     def can_partial_remerge() -> bool:
         return True
@@ -399,7 +401,7 @@ class ShopMerger(mergers.Merger):
         if not self._pool:
             multiprocessing.set_start_method("spawn", True)
         pool = self._pool or multiprocessing.Pool()
-        pool.map(partial(threaded_merge), diffs.items())
+        util.timed_map(pool, partial(threaded_merge), diffs.items())
         if not self._pool:
             pool.close()
             pool.join()
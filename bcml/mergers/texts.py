@@ -2,8 +2,13 @@
 # Copyright 2020 Nicene Nerd <macadamiadaze@gmail.com>
 # Licensed under GPLv3+
 import json
+import mmap
 import multiprocessing
+import os
+import struct
 import subprocess
+import threading
+import zlib
 from functools import partial, lru_cache
 from pathlib import Path
 from platform import system
@@ -160,7 +165,7 @@ def extract_refs(language: str, tmp_dir: Path, files: set = None):
     ]
     if files:
         x_args.extend(files)
-    else:
+    elif language:
         x_args.append(language)
     result: subprocess.CompletedProcess
     if system() == "Windows":
@@ -177,7 +182,83 @@ def extract_refs(language: str, tmp_dir: Path, files: set = None):
         raise RuntimeError(result.stderr)
 
 
-def diff_msyt(msyt: Path, hashes: dict, mod_out: Path, ref_dir: Path):
+class TextRefStore:
+    """
+    Random access to the reference MSYTs for every language, read from a single
+    memory mapped file built once from text_refs.7z.
+
+    The file holds a header, a compressed JSON index of `language/path` keys to
+    offsets and sizes, then each MSYT compressed on its own.
+    """
+
+    MAGIC = b"BCTR"
+    VERSION = 1
+    _header = struct.Struct("<4sII")
+
+    def __init__(self, store: Path):
+        with store.open("rb") as store_file:
+            self._map = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_size = self._header.unpack_from(self._map)
+        if magic != self.MAGIC or version != self.VERSION:
+            self._map.close()
+            raise ValueError(f"{store} is not a current BCML text reference store")
+        index_start = self._header.size
+        self._data = index_start + index_size
+        self._index = json.loads(
+            zlib.decompress(self._map[index_start : self._data]).decode("utf-8")
+        )
+
+    @classmethod
+    def build(cls, store: Path):
+        """Builds the store from the bundled text_refs.7z archive"""
+        index = {}
+        data = bytearray()
+        with TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            extract_refs(None, tmp_dir)
+            refs = tmp_dir / "refs"
+            for file in sorted(refs.rglob("**/*.msyt")):
+                packed = zlib.compress(file.read_bytes())
+                index[file.relative_to(refs).as_posix()] = (len(data), len(packed))
+                data += packed
+        packed_index = zlib.compress(json.dumps(index).encode("utf-8"))
+        store.parent.mkdir(parents=True, exist_ok=True)
+        tmp_store = store.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_store.write_bytes(
+            cls._header.pack(cls.MAGIC, cls.VERSION, len(packed_index))
+            + packed_index
+            + data
+        )
+        os.replace(tmp_store, store)
+
+    def get_text(self, language: str, file: str) -> str:
+        """Gets the reference MSYT text for a file, or None if there is none"""
+        try:
+            offset, size = self._index[f"{language}/{file}"]
+        except KeyError:
+            return None
+        start = self._data + offset
+        return zlib.decompress(self._map[start : start + size]).decode("utf-8")
+
+    def get_files(self, language: str) -> List[str]:
+        prefix = f"{language}/"
+        return [key[len(prefix) :] for key in self._index if key.startswith(prefix)]
+
+
+@lru_cache(None)
+def get_ref_store() -> TextRefStore:
+    source = util.get_exec_dir() / "data" / "text_refs.7z"
+    store = util.get_data_dir() / "text_refs.bin"
+    if not store.exists() or store.stat().st_mtime < source.stat().st_mtime:
+        TextRefStore.build(store)
+    try:
+        return TextRefStore(store)
+    except ValueError:
+        TextRefStore.build(store)
+        return TextRefStore(store)
+
+
+def diff_msyt(msyt: Path, hashes: dict, mod_out: Path, ref_lang: str):
     diff = {}
     filename = msyt.relative_to(mod_out).as_posix()
     if any(ex in filename for ex in EXCLUDE_TEXTS):
@@ -189,10 +270,12 @@ def diff_msyt(msyt: Path, hashes: dict, mod_out: Path, ref_dir: Path):
         pass
     else:
         text = data.decode("utf8")
-        if filename not in hashes:
+        ref_text = (
+            get_ref_store().get_text(ref_lang, filename) if filename in hashes else None
+        )
+        if ref_text is None:
             diff[filename] = json.loads(text, encoding="utf-8")["entries"]
         else:
-            ref_text = (ref_dir / filename).read_text("utf-8")
             if "".join(text.split()) != "".join(ref_text.split()):
                 ref_contents = json.loads(ref_text, encoding="utf-8")
                 contents = json.loads(text, encoding="utf-8")
@@ -237,14 +320,13 @@ def diff_language(bootup: Path, pool: multiprocessing.Pool = None) -> {}:
         msbt_to_msyt(mod_out, pool=pool)
         hashes = get_text_hashes(language)
         ref_lang = "XXen" if language.endswith("en") else language
-        print("Extracting reference texts...")
-        extract_refs(ref_lang, tmp_dir)
-        ref_dir = tmp_dir / "refs" / ref_lang
+        print("Loading reference texts...")
+        get_ref_store()
 
         this_pool = pool or multiprocessing.Pool()
         print("Identifying modified text files...")
         results = this_pool.map(
-            partial(diff_msyt, ref_dir=ref_dir, hashes=hashes, mod_out=mod_out),
+            partial(diff_msyt, ref_lang=ref_lang, hashes=hashes, mod_out=mod_out),
             mod_out.rglob("**/*.msyt"),
         )
         if not pool:
@@ -255,16 +337,17 @@ def diff_language(bootup: Path, pool: multiprocessing.Pool = None) -> {}:
     return diff
 
 
-def merge_msyt(file_data: tuple, tmp_dir: Path):
+def merge_msyt(file_data: tuple, tmp_dir: Path, ref_lang: str):
     filename: str = file_data[0]
     changes: dict = file_data[1]
     out = tmp_dir / filename
-    if out.exists():
-        text_data = json.loads(out.read_text("utf-8"), encoding="utf-8")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    ref_text = get_ref_store().get_text(ref_lang, filename)
+    if ref_text is not None:
+        text_data = json.loads(ref_text, encoding="utf-8")
         text_data["entries"].update(changes)
         out.write_text(json.dumps(text_data, ensure_ascii=False), encoding="utf-8")
     else:
-        out.parent.mkdir(parents=True, exist_ok=True)
         out.write_text(
             json.dumps(
                 {
@@ -278,6 +361,86 @@ def merge_msyt(file_data: tuple, tmp_dir: Path):
         )
 
 
+def merge_language(lang_diff: tuple) -> str:
+    """ Merges the text changes for one language into its master Bootup pack """
+    lang: str = lang_diff[0]
+    diffs: dict = lang_diff[1]
+    ref_lang = "XXen" if lang.endswith("en") else lang
+    try:
+        stock_msg = oead.Sarc(
+            util.get_stock_file_bytes(
+                str(util.get_game_file(f"Pack/Bootup_{lang}.pack"))
+                + f"//Message/Msg_{lang}.product.ssarc"
+            )
+        )
+    except (FileNotFoundError, AttributeError):
+        stock_msg = None
+    with TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        if stock_msg is None:
+            # Without the stock pack every reference text has to be rebuilt
+            for file in get_ref_store().get_files(ref_lang):
+                if file not in diffs:
+                    merge_msyt((file, {}), tmp_dir=tmp_dir, ref_lang=ref_lang)
+        for file_data in diffs.items():
+            merge_msyt(file_data, tmp_dir=tmp_dir, ref_lang=ref_lang)
+
+        m_args = [
+            MSYT_PATH,
+            "create",
+            "-d",
+            str(tmp_dir),
+            "-p",
+            "wiiu" if util.get_settings("wiiu") else "switch",
+            "-o",
+            str(tmp_dir),
+        ]
+        result: subprocess.CompletedProcess
+        if system() == "Windows":
+            result = subprocess.run(
+                m_args,
+                capture_output=True,
+                creationflags=util.CREATE_NO_WINDOW,
+                check=False,
+                text=True,
+            )
+        else:
+            result = subprocess.run(m_args, capture_output=True, check=False, text=True)
+        if result.stderr:
+            raise RuntimeError(f"There was an error merging game texts. {result.stderr}")
+
+        msg_sarc = (
+            oead.SarcWriter.from_sarc(stock_msg)
+            if stock_msg is not None
+            else oead.SarcWriter(
+                endian=oead.Endianness.Big
+                if util.get_settings("wiiu")
+                else oead.Endianness.Little
+            )
+        )
+        for file in tmp_dir.rglob("**/*.msbt"):
+            msg_sarc.files[file.relative_to(tmp_dir).as_posix()] = file.read_bytes()
+    bootup_sarc = oead.SarcWriter(
+        endian=oead.Endianness.Big
+        if util.get_settings("wiiu")
+        else oead.Endianness.Little
+    )
+    bootup_sarc.files[f"Message/Msg_{lang}.product.ssarc"] = util.compress(
+        msg_sarc.write()[1]
+    )
+    del msg_sarc
+
+    bootup_path = (
+        util.get_master_modpack_dir()
+        / util.get_content_path()
+        / "Pack"
+        / f"Bootup_{lang}.pack"
+    )
+    bootup_path.parent.mkdir(parents=True, exist_ok=True)
+    bootup_path.write_bytes(bootup_sarc.write()[1])
+    return lang
+
+
 class TextsMerger(mergers.Merger):
     # pylint: disable=abstract-method
     """ A merger for game texts """
@@ -391,101 +554,51 @@ class TextsMerger(mergers.Merger):
 
     @util.timed
     def perform_merge(self):
-        # pylint: disable=unsupported-assignment-operation
         langs = (
             {util.get_settings("lang")}
             if not self._options["all_langs"]
             else get_user_languages()
         )
-        for lang in langs:
-            print("Loading text mods...")
-            diffs = self.consolidate_diffs(self.get_all_diffs())
-            if not diffs or lang not in diffs:
-                print("No text merge necessary")
-                for bootup in util.get_master_modpack_dir().rglob("**/Bootup_????.pack"):
-                    bootup.unlink()
-                return
-            util.vprint(
-                {
-                    lang: {
-                        file: list(entries.keys())
-                        for file, entries in diffs[lang].items()
-                    }
-                }
-            )
-
-            print(f"Merging modded texts for {lang}...")
-            saved_files = set()
-            with TemporaryDirectory() as tmp:
-                tmp_dir = Path(tmp)
-                ref_lang = "XXen" if lang.endswith("en") else lang
-                extract_refs(ref_lang, tmp_dir)
-                tmp_dir = tmp_dir / "refs" / ref_lang
-                this_pool = self._pool or multiprocessing.Pool()
-                this_pool.map(partial(merge_msyt, tmp_dir=tmp_dir), diffs[lang].items())
-                if not self._pool:
-                    this_pool.close()
-                    this_pool.join()
-
-                m_args = [
-                    MSYT_PATH,
-                    "create",
-                    "-d",
-                    str(tmp_dir),
-                    "-p",
-                    "wiiu" if util.get_settings("wiiu") else "switch",
-                    "-o",
-                    str(tmp_dir),
-                ]
-                result: subprocess.CompletedProcess
-                if system() == "Windows":
-                    result = subprocess.run(
-                        m_args,
-                        capture_output=True,
-                        creationflags=util.CREATE_NO_WINDOW,
-                        check=False,
-                        text=True,
-                    )
-
-                else:
-                    result = subprocess.run(
-                        m_args, capture_output=True, check=False, text=True,
-                    )
-                if result.stderr:
-                    raise RuntimeError(
-                        f"There was an error merging game texts. {result.stderr}"
-                    )
-
-                msg_sarc = oead.SarcWriter(
-                    endian=oead.Endianness.Big
-                    if util.get_settings("wiiu")
-                    else oead.Endianness.Little
-                )
-                for file in tmp_dir.rglob("**/*.msbt"):
-                    msg_sarc.files[
-                        file.relative_to(tmp_dir).as_posix()
-                    ] = file.read_bytes()
-                    saved_files.add(file.relative_to(tmp_dir).as_posix())
-            bootup_sarc = oead.SarcWriter(
-                endian=oead.Endianness.Big
-                if util.get_settings("wiiu")
-                else oead.Endianness.Little
-            )
-            bootup_sarc.files[f"Message/Msg_{lang}.product.ssarc"] = util.compress(
-                msg_sarc.write()[1]
-            )
-
-            bootup_path = (
+        print("Loading text mods...")
+        diffs = self.consolidate_diffs(self.get_all_diffs())
+        if not diffs or not langs & set(diffs):
+            print("No text merge necessary")
+            for bootup in util.get_master_modpack_dir().rglob("**/Bootup_????.pack"):
+                bootup.unlink()
+            return
+        for lang in langs - set(diffs):
+            stale = (
                 util.get_master_modpack_dir()
                 / util.get_content_path()
                 / "Pack"
                 / f"Bootup_{lang}.pack"
             )
-            bootup_path.parent.mkdir(parents=True, exist_ok=True)
-            bootup_path.write_bytes(bootup_sarc.write()[1])
-            del bootup_sarc
-            del msg_sarc
+            if stale.exists():
+                stale.unlink()
+        langs = sorted(langs & set(diffs))
+        util.vprint(
+            {
+                lang: {
+                    file: list(entries.keys()) for file, entries in diffs[lang].items()
+                }
+                for lang in langs
+            }
+        )
+
+        print(f'Merging modded texts for {", ".join(langs)}...')
+        get_ref_store()
+        pool = self._pool or multiprocessing.Pool()
+        for lang in pool.imap_unordered(
+            merge_language, [(lang, diffs[lang]) for lang in langs]
+        ):
             print(f"{lang} texts merged successfully")
+        if not self._pool:
+            pool.close()
+            pool.join()
+
+    @staticmethod
+    def get_dependencies() -> set:
+        return {"packs"}
 
     def get_checkbox_options(self) -> List[tuple]:
         return [
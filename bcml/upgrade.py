@@ -3,7 +3,6 @@ import csv
 import json
 import shutil
 from configparser import ConfigParser
-from multiprocessing import Pool
 from pathlib import Path
 
 import oead
@@ -22,6 +21,7 @@ def convert_old_mods(source: Path = None):
     old_path = source or util.get_cemu_dir() / "graphicPacks" / "BCML"
     print("Copying old mods...")
     shutil.rmtree(mod_dir, ignore_errors=True)
+    util.gc_blob_store()
     shutil.copytree(old_path, mod_dir)
     print("Converting old mods...")
     for i, mod in enumerate(
@@ -32,6 +32,7 @@ def convert_old_mods(source: Path = None):
             convert_old_mod(mod, True)
         except Exception as err:
             shutil.rmtree(mod)
+            util.gc_blob_store()
             install.refresh_merges()
             raise RuntimeError(
                 f"BCML was unable to convert {mod.name[4:]}. Error: {str(err)}. Your old "
@@ -136,11 +137,14 @@ def convert_old_logs(mod_dir: Path):
 
 def _convert_rstb_log(mod: Path):
     (mod / "logs" / "rstb.log").unlink()
-    with Pool() as pool:
+    pool = util.get_pool()
+    try:
         files = install.find_modded_files(mod, pool=pool)
         merger = RstbMerger()
         merger.set_pool(pool)
         merger.log_diff(mod, files)
+    finally:
+        util.release_pool()
 
 
 def _convert_pack_log(mod: Path):
@@ -187,9 +191,14 @@ def _convert_text_log(log: Path) -> dict:
 
 def _convert_text_logs(logs_path: Path):
     diffs = {}
-    with Pool() as pool:
-        for diff in pool.imap_unordered(_convert_text_log, logs_path.glob("texts_*.yml")):
+    pool = util.get_pool()
+    try:
+        for diff in pool.imap_unordered(
+            _convert_text_log, logs_path.glob("texts_*.yml")
+        ):
             diffs.update(diff)
+    finally:
+        util.release_pool()
     fails = set()
     for text_pack in logs_path.glob("newtexts_*.sarc"):
         lang = text_pack.stem[9:]
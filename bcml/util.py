@@ -1,34 +1,44 @@
 # pylint: disable=missing-docstring,no-member,too-many-lines,invalid-name
 # Copyright 2020 Nicene Nerd <macadamiadaze@gmail.com>
 # Licensed under GPLv3+
+import atexit
 import json
+import mmap
 import os
 import re
 import shutil
 import socket
+import struct
 import sys
+import threading
 import urllib.error
 import urllib.request
 from base64 import b64decode
 from collections import OrderedDict
 from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from configparser import ConfigParser
 from contextlib import AbstractContextManager
 from copy import deepcopy
 from datetime import datetime
-from functools import lru_cache
+from functools import lru_cache, partial
 from io import StringIO
-from multiprocessing import current_process
+from multiprocessing import current_process, Pool, TimeoutError as PoolTimeout, Value
 from pathlib import Path
 from platform import system, python_version_tuple
 from pprint import pformat
 from re import findall
+from stat import S_IRGRP, S_IROTH, S_IRUSR
 from subprocess import run
 from tempfile import mkdtemp
 from time import time_ns
-from typing import Union, List, Dict, ByteString
+from typing import Union, List, Dict, ByteString, Iterable
 from xml.dom import minidom
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 import oead
 import xxhash  # pylint: disable=wrong-import-order
 from oead.aamp import ParameterIO, ParameterList  # pylint:disable=import-error
@@ -378,7 +388,9 @@ class BcmlMod:
         self.priority = priority
         self._info["priority"] = priority
         self._save_changes()
-        self.path.rename(self.path.parent.resolve() / self._get_folder_id())
+        new_path = self.path.parent.resolve() / self._get_folder_id()
+        self.path.rename(new_path)
+        self.path = new_path
 
     def get_preview(self) -> Path:
         if self._preview is None:
@@ -421,7 +433,56 @@ class BcmlMod:
 
 
 decompress = oead.yaz0.decompress
-compress = oead.yaz0.compress
+
+
+def compress(data: ByteString, level: int = None) -> bytes:
+    """Yaz0 compresses data at the given or configured compression level (1-9)"""
+    start = time_ns()
+    data = oead.yaz0.compress(
+        data, level=int(level or get_settings("compress_level") or 7)
+    )
+    setattr(compress, "time", getattr(compress, "time", 0) + time_ns() - start)
+    return data
+
+
+def compress_many(buffers: List[ByteString], pool: Pool = None) -> List[bytes]:
+    """
+    Yaz0 compresses several buffers in parallel, on the given pool or else on the
+    shared worker pool
+    """
+    if len(buffers) < 2:
+        return [compress(buffer) for buffer in buffers]
+    this_pool = pool or get_pool()
+    try:
+        return timed_map(this_pool, compress, [bytes(b) for b in buffers], 1)
+    finally:
+        if not pool:
+            release_pool()
+
+
+def _call_timed(func, *args) -> tuple:
+    start = getattr(compress, "time", 0)
+    result = func(*args)
+    return result, getattr(compress, "time", 0) - start
+
+
+def timed_starmap(pool: Pool, func, iterable, chunksize: int = None) -> list:
+    """
+    Works like `pool.starmap`, but also adds the time the workers spent compressing
+    to `compress.time` in this process, so `timed` can report it for the caller
+    """
+    results = pool.starmap(partial(_call_timed, func), iterable, chunksize)
+    setattr(
+        compress,
+        "time",
+        getattr(compress, "time", 0) + sum(spent for _, spent in results),
+    )
+    return [result for result, _ in results]
+
+
+def timed_map(pool: Pool, func, iterable, chunksize: int = None) -> list:
+    """Works like `pool.map`, adding worker compression time like `timed_starmap`"""
+    return timed_starmap(pool, func, ((item,) for item in iterable), chunksize)
 
 
 def vprint(content):
@@ -446,8 +507,13 @@ def vprint(content):
 def timed(func):
     def timed_function(*args, **kwargs):
         start = time_ns()
+        compress_start = getattr(compress, "time", 0)
         res = func(*args, **kwargs)
-        vprint(f"{func.__qualname__} took {(time_ns() - start) / 1000000000} seconds")
+        vprint(
+            f"{func.__qualname__} took {(time_ns() - start) / 1000000000} seconds, "
+            f"with {(getattr(compress, 'time', 0) - compress_start) / 1000000000} "
+            "seconds spent compressing across all processes"
+        )
         return res
 
     return timed_function
@@ -542,6 +608,7 @@ DEFAULT_SETTINGS = {
     "no_cemu": False,
     "wiiu": True,
     "no_hardlinks": False,
+    "compress_level": 7,
 }
 
 
@@ -575,6 +642,100 @@ def get_settings(name: str = "") -> {}:
 def save_settings():
     with (get_data_dir() / "settings.json").open("w", encoding="utf-8") as s_file:
         json.dump(get_settings.settings, s_file, indent=2)
+    # Workers cache settings and anything derived from them, so start fresh ones
+    close_pool()
+
+
+POOL_MAX_TASKS = 1000
+POOL_PING_TIMEOUT = 10
+_POOL_LOCK = threading.Lock()
+
+
+def _init_pool_worker(sarc_generation=None):
+    """Pre-loads the settings, hash table and RSTB calculator in a new pool worker"""
+    # pylint: disable=import-outside-toplevel,unused-import
+    if sarc_generation is not None:
+        setattr(_get_sarc_generation, "counter", sarc_generation)
+    try:
+        get_hash_table(get_settings("wiiu"))
+        # Importing the RSTB merger sets up its size calculator
+        from bcml.mergers import rstable
+    except Exception:  # pylint: disable=broad-except
+        # Nothing here is required, and a failing initializer would respawn forever
+        pass
+
+
+def _pool_is_healthy(pool: Pool) -> bool:
+    try:
+        pool.apply_async(os.getpid).get(timeout=POOL_PING_TIMEOUT)
+    except (ValueError, AssertionError, PoolTimeout):
+        return False
+    return True
+
+
+def get_pool() -> Pool:
+    """
+    Leases the shared worker pool, starting a new one if there is none yet. Between
+    operations, when nothing holds a lease, a pool which was marked stale or which
+    stopped responding is replaced first. Hand every lease back with
+    `release_pool()` and never close the returned pool yourself.
+    """
+    with _POOL_LOCK:
+        pool = getattr(get_pool, "pool", None)
+        if (
+            pool is not None
+            and not getattr(get_pool, "leases")
+            and (getattr(get_pool, "stale") or not _pool_is_healthy(pool))
+        ):
+            _terminate_pool()
+            pool = None
+        if pool is None:
+            # Make sure the hash index exists before the workers all go looking for it
+            get_hash_table(get_settings("wiiu"))
+            # Workers are replaced after a while, so their caches cannot pile up
+            pool = Pool(
+                initializer=_init_pool_worker,
+                initargs=(_get_sarc_generation(),),
+                maxtasksperchild=POOL_MAX_TASKS,
+            )
+            setattr(get_pool, "pool", pool)
+            setattr(get_pool, "leases", 0)
+            setattr(get_pool, "stale", False)
+        setattr(get_pool, "leases", getattr(get_pool, "leases") + 1)
+        return pool
+
+
+def release_pool():
+    """Hands back a lease on the shared pool, shutting it down if it went stale"""
+    with _POOL_LOCK:
+        if getattr(get_pool, "pool", None) is None:
+            return
+        setattr(get_pool, "leases", max(getattr(get_pool, "leases") - 1, 0))
+        if not getattr(get_pool, "leases") and getattr(get_pool, "stale"):
+            _terminate_pool()
+
+
+def close_pool():
+    """
+    Terminates the shared worker pool if nothing holds a lease on it. A pool which
+    is still in use is only marked stale, and goes when its last lease is released.
+    """
+    with _POOL_LOCK:
+        if getattr(get_pool, "leases", 0):
+            setattr(get_pool, "stale", True)
+            return
+        _terminate_pool()
+
+
+@atexit.register
+def _terminate_pool():
+    pool = getattr(get_pool, "pool", None)
+    if pool is None:
+        return
+    setattr(get_pool, "pool", None)
+    setattr(get_pool, "leases", 0)
+    pool.terminate()
+    pool.join()
 
 
 def get_cemu_dir() -> Path:
@@ -793,6 +954,205 @@ def get_modpack_dir() -> Path:
     )
 
 
+FICLONE = 0x40049409
+TRANSFER_THREADS = 8
+
+
+def copy_file(src: Path, dest: Path):
+    """
+    Copies a file by the cheapest means available: a reflink on filesystems which
+    can share extents, such as btrfs or XFS, then an in-kernel copy with
+    `copy_file_range` or `sendfile`, and only then a buffered copy.
+    """
+    with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+        if fcntl:
+            try:
+                fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+                return
+            except OSError:
+                pass
+        size = os.fstat(src_file.fileno()).st_size
+        src_fd, dest_fd = src_file.fileno(), dest_file.fileno()
+        if hasattr(os, "copy_file_range"):
+            kernel_copy = lambda offset: os.copy_file_range(
+                src_fd, dest_fd, size - offset, offset_src=offset
+            )
+        elif hasattr(os, "sendfile") and SYSTEM == "Linux":
+            kernel_copy = lambda offset: os.sendfile(
+                dest_fd, src_fd, offset, size - offset
+            )
+        else:
+            kernel_copy = None
+        if kernel_copy:
+            try:
+                offset = 0
+                while offset < size:
+                    sent = kernel_copy(offset)
+                    if not sent:
+                        break
+                    offset += sent
+                if offset >= size:
+                    return
+            except OSError:
+                pass
+            src_file.seek(0)
+            dest_file.seek(0)
+            dest_file.truncate()
+        shutil.copyfileobj(src_file, dest_file, 1024 * 1024)
+
+
+def move_file(src: Path, dest: Path):
+    """Moves a file by renaming it if possible, or else copying it"""
+    try:
+        os.replace(src, dest)
+    except OSError:
+        copy_file(src, dest)
+        os.remove(src)
+
+
+def transfer_files(pairs: List[tuple], link: bool = False, move: bool = False):
+    """
+    Copies, hardlinks or moves many files at once on a few threads, creating any
+    missing folders first. Links which fail fall back to copies.
+    """
+
+    def transfer(pair: tuple):
+        src, dest = pair
+        if move:
+            move_file(src, dest)
+            return
+        if link:
+            try:
+                os.link(src, dest)
+                return
+            except OSError:
+                pass
+        copy_file(src, dest)
+
+    for folder in {Path(dest).parent for _, dest in pairs}:
+        folder.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=TRANSFER_THREADS) as executor:
+        for _ in executor.map(transfer, pairs):
+            pass
+
+
+def copy_tree(src: Path, dest: Path):
+    """Copies a folder tree with `copy_file`, several files at a time"""
+    dest.mkdir(parents=True, exist_ok=True)
+    transfer_files(
+        [(f, dest / f.relative_to(src)) for f in src.rglob("*") if f.is_file()]
+    )
+
+
+@lru_cache(None)
+def get_blob_store_dir() -> Path:
+    blob_dir = get_storage_dir() / "blobs"
+    if not blob_dir.exists():
+        blob_dir.mkdir(parents=True, exist_ok=True)
+    return blob_dir
+
+
+def get_file_key(file: Path) -> str:
+    """Gets the content address of a file: its xxHash and its size"""
+    digest = xxhash.xxh64()
+    with file.open("rb") as stream:
+        for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return f"{digest.hexdigest()}{file.stat().st_size:010x}"
+
+
+def link_from_store(file: Path, out: Path, move: bool = False):
+    """
+    Places a file at `out` as a hardlink to the blob with the same contents, adding
+    the blob first if no mod has it yet. Copies instead where links are unsupported.
+    With `move`, a new blob is made by moving the source file into the store.
+    """
+    key = get_file_key(file)
+    blob = get_blob_store_dir() / key[:2] / key
+    if not blob.exists():
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp_blob = blob.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        if move:
+            move_file(file, tmp_blob)
+        else:
+            try:
+                os.link(file, tmp_blob)
+            except OSError:
+                copy_file(file, tmp_blob)
+        if SYSTEM != "Windows":
+            # Writing through any installed copy now fails instead of changing the
+            # file for every mod; Windows cannot delete read-only files, so skip it
+            os.chmod(tmp_blob, S_IRUSR | S_IRGRP | S_IROTH)
+        os.replace(tmp_blob, blob)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(blob, out)
+    except OSError:
+        copy_file(blob, out)
+
+
+def write_new_file(file: Path, data: ByteString):
+    """
+    Writes a file as a new file instead of through an existing one. Installed mod
+    files can be hardlinks to blobs which other mods share, and merged SARCs in the
+    master mod can be hardlinks to the pack cache, so any code which may rewrite
+    one, or a copy linked from one, must use this.
+    """
+    if file.exists() or file.is_symlink():
+        file.unlink()
+    file.write_bytes(data)
+
+
+def store_mod_files(src: Path, dest: Path, move: bool = False):
+    """
+    Copies a mod folder into place, with its game files deduplicated through the
+    blob store. Logs and the metadata at the top of the folder are edited in place
+    later, so those are always plain copies. With `move`, which suits a temporary
+    source folder, files are renamed into place instead of copied wherever the
+    store and the source are on the same volume.
+    """
+    dest.mkdir(parents=True, exist_ok=True)
+    copies = []
+    for file in src.rglob("*"):
+        if not file.is_file():
+            continue
+        rel = file.relative_to(src)
+        if len(rel.parts) > 1 and "logs" not in rel.parts:
+            link_from_store(file, dest / rel, move=move)
+        else:
+            copies.append((file, dest / rel))
+    transfer_files(copies, move=move)
+
+
+def gc_blob_store() -> int:
+    """
+    Removes blobs which no installed mod links to, returning the bytes freed. Only
+    links in the mod folders of either platform count as references. An exported
+    mod or graphic pack linked to a blob keeps the data under its own name when the
+    blob goes, so links from outside those folders do not keep a blob in the store.
+    """
+    referenced = set()
+    for mod_dir in {
+        get_modpack_dir(),
+        get_storage_dir() / "mods",
+        get_storage_dir() / "mods_nx",
+    }:
+        for root, _, files in os.walk(mod_dir):
+            for name in files:
+                stat = os.stat(os.path.join(root, name))
+                if stat.st_nlink > 1:
+                    referenced.add((stat.st_dev, stat.st_ino))
+    freed = 0
+    for blob in get_blob_store_dir().glob("*/*"):
+        if blob.suffix == ".tmp":
+            continue
+        stat = blob.stat()
+        if (stat.st_dev, stat.st_ino) not in referenced:
+            blob.unlink()
+            freed += stat.st_size
+    return freed
+
+
 @lru_cache(None)
 def get_game_file(path: Union[Path, str], aoc: bool = False) -> Path:
     if str(path).replace("\\", "/").startswith(f"{get_content_path()}/"):
@@ -832,24 +1192,168 @@ def get_game_file(path: Union[Path, str], aoc: bool = False) -> Path:
     raise FileNotFoundError(f"File {str(path)} was not found in game dump.")
 
 
+SARC_CACHE_SIZE = 256 * 1024 * 1024
+
+
+class SarcCache:
+    """
+    A bounded LRU cache of opened SARCs, keyed by file path, modification time, size
+    and the path of nested SARCs within it, so that repeated reads from the same pack
+    do not reopen and decompress it each time
+    """
+
+    def __init__(self, max_size: int = SARC_CACHE_SIZE):
+        self._sarcs = OrderedDict()
+        self._size = 0
+        self._lock = threading.RLock()
+        self.max_size = max_size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: Path, nests: tuple = ()) -> oead.Sarc:
+        stat = path.stat()
+        key = (str(path), stat.st_mtime_ns, stat.st_size, tuple(nests))
+        with self._lock:
+            generation = _get_sarc_generation().value
+            if generation != self.generation:
+                self.clear()
+                self.generation = generation
+            if key in self._sarcs:
+                self.hits += 1
+                self._sarcs.move_to_end(key)
+                return self._sarcs[key][1]
+            self.misses += 1
+            if nests:
+                parent = self.get(path, nests[:-1])
+                data = unyaz_if_needed(parent.get_file(nests[-1]).data)
+            else:
+                data = unyaz_if_needed(path.read_bytes())
+            if "Pool" in current_process().name and (
+                get_master_modpack_dir() in path.parents
+            ):
+                # The master mod is rewritten in place while workers live on, and
+                # coarse modification times could hide that, so always read it
+                return oead.Sarc(data)
+            return self._add(key, data)
+
+    def put(self, path: Path, data: bytes):
+        """Caches the decompressed contents just written to a SARC file"""
+        stat = path.stat()
+        with self._lock:
+            self._add((str(path), stat.st_mtime_ns, stat.st_size, ()), data)
+
+    def _add(self, key: tuple, data: bytes) -> oead.Sarc:
+        sarc = oead.Sarc(data)
+        if key in self._sarcs:
+            self._size -= len(self._sarcs.pop(key)[0])
+        self._sarcs[key] = (data, sarc)
+        self._size += len(data)
+        while self._size > self.max_size and len(self._sarcs) > 1:
+            self._size -= len(self._sarcs.popitem(last=False)[1][0])
+        return sarc
+
+    def clear(self):
+        with self._lock:
+            self._sarcs.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __str__(self):
+        return f"{self.hits} hits, {self.misses} misses, {len(self._sarcs)} open SARCs"
+
+
+@lru_cache(None)
+def get_sarc_cache() -> SarcCache:
+    return SarcCache()
+
+
+def _get_sarc_generation():
+    if not hasattr(_get_sarc_generation, "counter"):
+        setattr(_get_sarc_generation, "counter", Value("i", 0))
+    return getattr(_get_sarc_generation, "counter")
+
+
+def clear_sarc_caches():
+    """
+    Empties the SARC cache of this process and of every shared pool worker, which
+    each drop theirs before their next read. Call it before merging or installing.
+    """
+    counter = _get_sarc_generation()
+    with counter.get_lock():
+        counter.value += 1
+    get_sarc_cache().clear()
+
+
 def get_nested_file_bytes(file: str, unyaz: bool = True) -> bytes:
     nests = file.split("//")
-    sarcs = []
-    sarcs.append(oead.Sarc(unyaz_if_needed(Path(nests[0]).read_bytes())))
-    i = 1
-    while i < len(nests) - 1:
-        sarc_bytes = unyaz_if_needed(sarcs[i - 1].get_file(nests[i]).data)
-        sarcs.append(oead.Sarc(sarc_bytes))
-        i += 1
-    file_bytes = sarcs[-1].get_file(nests[-1]).data
+    sarc = get_sarc_cache().get(Path(nests[0]), tuple(nests[1:-1]))
+    file_bytes = sarc.get_file(nests[-1]).data
     if file_bytes[0:4] == b"Yaz0" and unyaz:
         file_bytes = decompress(file_bytes)
     else:
         file_bytes = bytes(file_bytes)
-    del sarcs
     return file_bytes
 
 
+STOCK_CACHE_SIZE = 512 * 1024 * 1024
+
+
+@lru_cache(None)
+def get_stock_cache_dir() -> Path:
+    cache_dir = get_data_dir() / "stock_cache"
+    if not cache_dir.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def get_stock_file_bytes(file: str) -> bytes:
+    """
+    Gets the decompressed contents of a game dump file, using the same nested path
+    syntax as `get_nested_file_bytes`, through a persistent on-disk cache keyed by
+    the dump path and its modification time
+    """
+    nests = file.split("//")
+    stat = Path(nests[0]).stat()
+    key = xxhash.xxh64_hexdigest(f"{file}|{stat.st_mtime_ns}|{stat.st_size}")
+    cache_file = get_stock_cache_dir() / f"{key}.bin"
+    try:
+        data = cache_file.read_bytes()
+        os.utime(cache_file)
+        return data
+    except FileNotFoundError:
+        pass
+    if len(nests) > 1:
+        data = get_nested_file_bytes(file, unyaz=True)
+    else:
+        data = unyaz_if_needed(Path(file).read_bytes())
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_file.write_bytes(data)
+    os.replace(tmp_file, cache_file)
+    trim_stock_cache()
+    return data
+
+
+def trim_stock_cache(max_size: int = STOCK_CACHE_SIZE):
+    """Evicts the least recently used stock files until the cache fits its size cap"""
+    entries = []
+    for cache_file in get_stock_cache_dir().glob("*.bin"):
+        try:
+            entries.append((cache_file.stat(), cache_file))
+        except FileNotFoundError:
+            continue
+    total = sum(stat.st_size for stat, _ in entries)
+    for stat, cache_file in sorted(entries, key=lambda entry: entry[0].st_mtime):
+        if total <= max_size:
+            break
+        try:
+            cache_file.unlink()
+        except (FileNotFoundError, PermissionError):
+            continue
+        total -= stat.st_size
+
+
 @lru_cache(None)
 def get_master_modpack_dir() -> Path:
     master = get_modpack_dir() / "9999_BCML"
@@ -858,41 +1362,154 @@ def get_master_modpack_dir() -> Path:
     return master
 
 
+class HashTable:
+    """
+    A read-only mapping of canonical file names to their stock xxHash64 digests,
+    memory mapped from a compact binary index so that all processes share one copy.
+
+    The index is a header followed by entries sorted by the xxHash64 of the name,
+    each pointing to a run of digests in a packed array after them.
+    """
+
+    MAGIC = b"BCHT"
+    VERSION = 1
+    _header = struct.Struct("<4sII")
+    _entry = struct.Struct("<QII")
+
+    def __init__(self, index: Path, wiiu: bool):
+        self._wiiu = wiiu
+        with index.open("rb") as index_file:
+            self._map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count = self._header.unpack_from(self._map)
+        if magic != self.MAGIC or version != self.VERSION:
+            self._map.close()
+            raise ValueError(f"{index} is not a current BCML hash table index")
+        self._digests = self._header.size + self._count * self._entry.size
+
+    @classmethod
+    def build(cls, source: Path, index: Path):
+        """Builds a binary index from a Yaz0-compressed JSON hash table"""
+        table = json.loads(decompress(source.read_bytes()).decode("utf-8"))
+        entries = {}
+        for name, digests in table.items():
+            entries.setdefault(
+                xxhash.xxh64_intdigest(name.encode("utf-8")), set()
+            ).update(digests)
+        header = bytearray(cls._header.pack(cls.MAGIC, cls.VERSION, len(entries)))
+        packed_digests = bytearray()
+        start = 0
+        for name_hash in sorted(entries):
+            digests = sorted(entries[name_hash])
+            header += cls._entry.pack(name_hash, start, len(digests))
+            packed_digests += struct.pack(f"<{len(digests)}Q", *digests)
+            start += len(digests)
+        index.parent.mkdir(parents=True, exist_ok=True)
+        tmp_index = index.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_index.write_bytes(bytes(header + packed_digests))
+        try:
+            os.replace(tmp_index, index)
+        except PermissionError:
+            # Another process has the old index mapped, so it will be rebuilt later
+            tmp_index.unlink()
+
+    def _find(self, name: str) -> int:
+        if not isinstance(name, str):
+            return -1
+        name_hash = xxhash.xxh64_intdigest(name.encode("utf-8"))
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            mid_hash = self._entry.unpack_from(
+                self._map, self._header.size + mid * self._entry.size
+            )[0]
+            if mid_hash < name_hash:
+                low = mid + 1
+            elif mid_hash > name_hash:
+                high = mid
+            else:
+                return mid
+        return -1
+
+    def __contains__(self, name: str) -> bool:
+        return self._find(name) >= 0
+
+    def __getitem__(self, name: str) -> tuple:
+        i = self._find(name)
+        if i < 0:
+            raise KeyError(name)
+        _, start, count = self._entry.unpack_from(
+            self._map, self._header.size + i * self._entry.size
+        )
+        return struct.unpack_from(f"<{count}Q", self._map, self._digests + start * 8)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, name: str, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __reduce__(self):
+        # Reopen the shared mapping in other processes instead of copying it
+        return (get_hash_table, (self._wiiu,))
+
+
 @lru_cache(2)
-def get_hash_table(wiiu: bool = True) -> {}:
-    return json.loads(
-        decompress(
-            (
-                get_exec_dir()
-                / "data"
-                / "hashes"
-                / f'{"wiiu" if wiiu else "switch"}.sjson'
-            ).read_bytes()
-        ).decode("utf-8")
+def get_hash_table(wiiu: bool = True) -> HashTable:
+    platform = "wiiu" if wiiu else "switch"
+    source = get_exec_dir() / "data" / "hashes" / f"{platform}.sjson"
+    index = get_data_dir() / "hashes" / f"{platform}.bin"
+    if not index.exists() or index.stat().st_mtime < source.stat().st_mtime:
+        HashTable.build(source, index)
+    try:
+        return HashTable(index, wiiu)
+    except ValueError:
+        HashTable.build(source, index)
+        return HashTable(index, wiiu)
+
+
+def get_hash_table_id(wiiu: bool = True) -> str:
+    """Identifies the hash table in use, so caches built on it can tell if it changes"""
+    platform = "wiiu" if wiiu else "switch"
+    source = get_exec_dir() / "data" / "hashes" / f"{platform}.sjson"
+    source_stat = source.stat()
+    return "|".join(
+        map(
+            str,
+            (platform, HashTable.VERSION, source_stat.st_mtime_ns, source_stat.st_size),
+        )
     )
 
 
-@lru_cache(None)
-def get_canon_name(file: str, allow_no_source: bool = False) -> str:
-    if isinstance(file, str):
-        file = Path(file)
-    name = (
-        file.as_posix()
-        .replace("\\", "/")
-        .replace("atmosphere/", "")
-        .replace("contents/", "")
-        .replace("titles/", "")
-        .replace("7EF0", "7ef0")
-        .replace("1E0", "1e0")
-        .replace("1F0", "1f0")
-        .replace("01007ef00011e000/romfs", "content")
-        .replace("01007ef00011e000/romfs", "content")
-        .replace("01007ef00011e001/romfs", "aoc/0010")
-        .replace("01007ef00011e002/romfs", "aoc/0010")
-        .replace("01007ef00011f001/romfs", "aoc/0010")
-        .replace("01007ef00011f002/romfs", "aoc/0010")
-        .replace(".s", ".")
-    )
+CANON_CACHE_SIZE = 65536
+CANON_PATTERN = re.compile(
+    r"\\|(?:atmosphere|contents|titles)[/\\]"
+    r"|(?i:01007ef00011(e000|e001|e002|f001|f002)[/\\]romfs)"
+    r"|7EF0|1E0|1F0|\.s"
+)
+CANON_TOKENS = {"\\": "/", "7EF0": "7ef0", "1E0": "1e0", "1F0": "1f0", ".s": "."}
+
+
+def _canon_replace(match) -> str:
+    title = match.group(1)
+    if title:
+        return "content" if title.lower() == "e000" else "aoc/0010"
+    return CANON_TOKENS.get(match.group(0), "")
+
+
+@lru_cache(4096)
+def _get_canon_dir(folder: str) -> str:
+    return CANON_PATTERN.sub(_canon_replace, folder + "/")
+
+
+@lru_cache(CANON_CACHE_SIZE)
+def _get_canon_name(file: str, allow_no_source: bool) -> str:
+    folder, _, name = Path(file).as_posix().rpartition("/")
+    name = CANON_PATTERN.sub(_canon_replace, name)
+    if folder:
+        name = _get_canon_dir(folder) + name
     if "aoc/" in name:
         name = name.replace("aoc/content", "aoc").replace("aoc", "Aoc")
     elif "content/" in name and "/aoc" not in name:
@@ -902,6 +1519,35 @@ def get_canon_name(file: str, allow_no_source: bool = False) -> str:
     return name
 
 
+def get_canon_name(file: Union[str, Path], allow_no_source: bool = False) -> str:
+    """
+    Gets the canonical resource name of a game file path. Paths and strings share the
+    same bounded cache, and the known Switch and Wii U prefixes are rewritten with a
+    single compiled pattern.
+    """
+    if isinstance(file, Path):
+        file = file.as_posix()
+    return _get_canon_name(file, allow_no_source)
+
+
+def get_canon_names(
+    files: Iterable[Union[str, Path]], root: Path = None, allow_no_source: bool = False
+) -> Dict[Union[str, Path], str]:
+    """
+    Gets the canonical names of a whole file listing at once, optionally relative to
+    a root folder. Files which are not in a valid content directory are left out.
+    """
+    canons = {}
+    for file in files:
+        try:
+            canons[file] = get_canon_name(
+                file.relative_to(root) if root else file, allow_no_source
+            )
+        except ValueError:
+            continue
+    return canons
+
+
 @lru_cache(None)
 def get_mod_id(mod_name: str, priority: int) -> str:
     return f"{priority:04}_" + get_safe_pathname(mod_name)
@@ -932,7 +1578,7 @@ def is_file_modded(name: str, file: Union[bytes, Path], count_new: bool = True)
         if isinstance(file, bytes)
         else file.read_bytes()
         if isinstance(file, Path)
-        else bytes(file)
+        else memoryview(file)
     )
     if contents[0:4] == b"Yaz0":
         contents = decompress(contents)
@@ -949,36 +1595,113 @@ def is_file_sarc(path: str) -> bool:
     return ext in SARC_EXTS
 
 
-def unyaz_if_needed(file_bytes: bytes) -> bytes:
+def unyaz_if_needed(file_bytes: ByteString, copy: bool = True) -> ByteString:
+    """
+    Decompresses Yaz0 data, or else returns it as bytes. With `copy=False`, buffers
+    such as SARC entry memoryviews are passed through as they are, and decompressed
+    data is not copied again, so callers only materialize bytes when they write.
+    """
     if file_bytes[0:4] == b"Yaz0":
-        return bytes(decompress(file_bytes))
+        data = decompress(file_bytes)
+        return bytes(data) if copy else data
+    if not copy:
+        return file_bytes
     return file_bytes if isinstance(file_bytes, bytes) else bytes(file_bytes)
 
 
-def inject_file_into_sarc(file: str, data: bytes, sarc: str, create_sarc: bool = False):
+class SarcTransaction(AbstractContextManager):
+    """
+    Collects edits to SARCs and actor packs in the master mod while open, then
+    writes each edited file only once when committed, instead of rewriting it
+    for every injected file
+    """
+
+    active = None
+
+    def __init__(self, pool: Pool = None):
+        self._pool = pool
+        self._sarcs: Dict[str, tuple] = {}
+        self._actors: Dict[str, dict] = {}
+
+    def __enter__(self):
+        SarcTransaction.active = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            SarcTransaction.active = None
+
+    def add_files(self, sarc: str, files: Dict[str, bytes], create_sarc: bool):
+        queued, create = self._sarcs.get(sarc, ({}, False))
+        queued.update(files)
+        self._sarcs[sarc] = (queued, create or create_sarc)
+
+    def add_actor_files(self, actor: str, files: Dict[str, ByteString]):
+        self._actors.setdefault(actor, {}).update(files)
+
+    def creates(self, sarc: str) -> bool:
+        return sarc in self._sarcs and self._sarcs[sarc][1]
+
+    def commit(self):
+        actors, self._actors = self._actors, {}
+        # Title actors are injected into TitleBG.pack, so write actors first
+        packs = {
+            actor: _build_actor_pack(actor, files) for actor, files in actors.items()
+        }
+        for actor, pack in zip(
+            packs, compress_many(list(packs.values()), pool=self._pool)
+        ):
+            _save_actor_pack(actor, pack)
+        sarcs, self._sarcs = self._sarcs, {}
+        for sarc, (files, create) in sarcs.items():
+            _write_sarc_files(sarc, files, create)
+
+
+def _write_sarc_files(sarc: str, files: Dict[str, bytes], create_sarc: bool):
     path = get_master_modpack_dir() / get_content_path() / sarc
-    if path.exists() or create_sarc:
-        if not path.exists():
-            path.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy(get_game_file(sarc), path)
-        sarc_data = path.read_bytes()
-        yaz = sarc_data[0:4] == b"Yaz0"
-        if yaz:
-            sarc_data = decompress(sarc_data)
-        old_sarc = oead.Sarc(sarc_data)
-        del sarc_data
-        new_sarc = oead.SarcWriter.from_sarc(old_sarc)
-        del old_sarc
-        new_sarc.files[file] = data if isinstance(data, bytes) else bytes(data)
-        new_bytes = new_sarc.write()[1]
-        del new_sarc
-        path.write_bytes(new_bytes if not yaz else compress(new_bytes))
-        del new_bytes
-    else:
+    if not path.exists():
+        if not create_sarc:
+            raise FileNotFoundError(f"{sarc} is not present in the master BCML mod")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(get_game_file(sarc), path)
+    with path.open("rb") as sarc_file:
+        yaz = sarc_file.read(4) == b"Yaz0"
+    new_sarc = oead.SarcWriter.from_sarc(get_sarc_cache().get(path))
+    for file, data in files.items():
+        new_sarc.files[file] = data
+    new_bytes = bytes(new_sarc.write()[1])
+    del new_sarc
+    write_new_file(path, new_bytes if not yaz else compress(new_bytes))
+    get_sarc_cache().put(path, new_bytes)
+    del new_bytes
+
+
+def inject_file_into_sarc(file: str, data: bytes, sarc: str, create_sarc: bool = False):
+    transaction = SarcTransaction.active
+    if not (
+        create_sarc
+        or (get_master_modpack_dir() / get_content_path() / sarc).exists()
+        or (transaction and transaction.creates(sarc))
+    ):
         raise FileNotFoundError(f"{sarc} is not present in the master BCML mod")
+    files = {file: data if isinstance(data, bytes) else bytes(data)}
+    if transaction:
+        transaction.add_files(sarc, files, create_sarc)
+    else:
+        _write_sarc_files(sarc, files, create_sarc)
 
 
 def inject_files_into_actor(actor: str, files: Dict[str, ByteString]):
+    if SarcTransaction.active:
+        SarcTransaction.active.add_actor_files(actor, files)
+    else:
+        _save_actor_pack(actor, compress(_build_actor_pack(actor, files)))
+
+
+def _build_actor_pack(actor: str, files: Dict[str, ByteString]) -> bytes:
     actor_sarc: oead.Sarc
     if actor in TITLE_ACTORS:
         title_path = (
@@ -986,11 +1709,9 @@ def inject_files_into_actor(actor: str, files: Dict[str, ByteString]):
         )
         if not title_path.exists():
             title_path = get_game_file("Pack/TitleBG.pack")
-        title_sarc = oead.Sarc(title_path.read_bytes())
-        actor_sarc = oead.Sarc(
-            decompress(title_sarc.get_file_data(f"Actor/Pack/{actor}.sbactorpack").data)
+        actor_sarc = get_sarc_cache().get(
+            title_path, (f"Actor/Pack/{actor}.sbactorpack",)
         )
-        del title_sarc
     else:
         actor_path = (
             get_master_modpack_dir()
@@ -1006,8 +1727,10 @@ def inject_files_into_actor(actor: str, files: Dict[str, ByteString]):
     del actor_sarc
     for file, data in files.items():
         new_sarc.files[file] = oead.Bytes(data)
-    out_bytes = compress(new_sarc.write()[1])
+    return bytes(new_sarc.write()[1])
+
 
+def _save_actor_pack(actor: str, out_bytes: bytes):
     if actor in TITLE_ACTORS:
         inject_file_into_sarc(
             f"Actor/Pack/{actor}.sbactorpack", out_bytes, "Pack/TitleBG.pack", True
@@ -1021,7 +1744,7 @@ def inject_files_into_actor(actor: str, files: Dict[str, ByteString]):
             / f"{actor}.sbactorpack"
         )
         output.parent.mkdir(parents=True, exist_ok=True)
-        output.write_bytes(out_bytes)
+        write_new_file(output, out_bytes)
 
 
 @lru_cache(None)
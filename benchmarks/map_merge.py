@@ -0,0 +1,127 @@
+"""
+Times the map diff and merge on a synthetic map unit of 10,000 objects, where a mod
+edits 1,000 objects, deletes 500 and adds 1,000 new ones. The list-based lookups
+used before HashId indexing are timed next to the current code for comparison. Run
+it from the repository root with `python -m benchmarks.map_merge`.
+"""
+# Licensed under GPLv3+
+import random
+from time import perf_counter
+
+import oead
+from oead.byml import Hash, Array
+
+from bcml.mergers.mubin import diff_map_objs, merge_map_objs
+
+STOCK_OBJS = 10000
+EDITS = 1000
+DELETES = 500
+ADDS = 1000
+LINK_EVERY = 20
+HASH_RANGE = range(2 ** 32)
+
+
+def make_obj(hash_id: int, rand: random.Random) -> Hash:
+    return Hash(
+        {
+            "HashId": oead.U32(hash_id),
+            "UnitConfigName": f"Obj_{rand.randrange(500):03d}",
+            "Translate": Array([oead.F32(rand.uniform(-4000, 4000)) for _ in range(3)]),
+        }
+    )
+
+
+def old_diff_map_objs(base_map: Hash, mod_map: Hash) -> Hash:
+    base_hashes = [int(obj["HashId"]) for obj in base_map["Objs"]]
+    base_links = {
+        int(link["DestUnitHashId"])
+        for obj in base_map["Objs"]
+        for link in obj.get("LinksToObj", Array())
+        if "LinksToObj" in obj
+    }
+    mod_hashes = [int(obj["HashId"]) for obj in mod_map["Objs"]]
+    diffs = Hash()
+    diffs["add"] = Array(
+        {obj for obj in mod_map["Objs"] if int(obj["HashId"]) not in base_hashes}
+    )
+    diffs["mod"] = Hash(
+        {
+            str(obj["HashId"]): obj
+            for obj in mod_map["Objs"]
+            if int(obj["HashId"]) in base_hashes
+            and obj != base_map["Objs"][base_hashes.index(int(obj["HashId"]))]
+        }
+    )
+    diffs["del"] = Array(
+        {
+            oead.U32(hash_id)
+            for hash_id in base_hashes
+            if hash_id not in {*mod_hashes, *base_links}
+        }
+    )
+    return diffs
+
+
+def old_merge_map_objs(objs: Array, changes: Hash) -> list:
+    objs = list(objs)
+    stock_hashes = [int(obj["HashId"]) for obj in objs]
+    for hash_id, actor in changes["mod"].items():
+        try:
+            objs[stock_hashes.index(int(hash_id))] = actor
+        except ValueError:
+            changes["add"].append(actor)
+    for map_del in sorted(
+        changes["del"],
+        key=lambda change: stock_hashes.index(int(change))
+        if int(change) in stock_hashes
+        else -1,
+        reverse=True,
+    ):
+        if int(map_del) in stock_hashes:
+            objs.pop(stock_hashes.index(int(map_del)))
+    objs.extend(
+        [
+            change
+            for change in changes["add"]
+            if int(change["HashId"]) not in stock_hashes
+        ]
+    )
+    return sorted(objs, key=lambda actor: int(actor["HashId"]))
+
+
+def main():
+    rand = random.Random(0)
+    hashes = rand.sample(HASH_RANGE, STOCK_OBJS + ADDS)
+    stock_objs = [make_obj(hash_id, rand) for hash_id in hashes[:STOCK_OBJS]]
+    for obj in stock_objs[::LINK_EVERY]:
+        obj["LinksToObj"] = Array(
+            [Hash({"DestUnitHashId": oead.U32(rand.choice(hashes[:STOCK_OBJS]))})]
+        )
+    base_map = Hash({"Objs": Array(stock_objs)})
+
+    mod_objs = [make_obj(int(obj["HashId"]), rand) for obj in stock_objs[:EDITS]]
+    mod_objs += stock_objs[EDITS + DELETES :]
+    mod_objs += [make_obj(hash_id, rand) for hash_id in hashes[STOCK_OBJS:]]
+    mod_map = Hash({"Objs": Array(mod_objs)})
+
+    for label, diff_objs, merge_objs in (
+        ("List lookups", old_diff_map_objs, old_merge_map_objs),
+        ("HashId index", diff_map_objs, merge_map_objs),
+    ):
+        start = perf_counter()
+        diff = diff_objs(base_map, mod_map)
+        diffed_at = perf_counter()
+        # Merging adds to the change lists, so work on a copy
+        changes = oead.byml.from_text(oead.byml.to_text(diff))
+        merge_start = perf_counter()
+        merged = merge_objs(base_map["Objs"], changes)
+        merged_at = perf_counter()
+        print(
+            f"{label}: diffed {len(mod_objs)} objects against {STOCK_OBJS} in "
+            f"{diffed_at - start:.3f} seconds, merged {len(merged)} objects in "
+            f"{merged_at - merge_start:.3f} seconds"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Times the save data merge on synthetic logs: 20 mods which each add 5,000 flags
+and delete a few stock ones, merged over a stock table of 60,000 flags. Run it from
+the repository root with `python -m benchmarks.savedata_merge`.
+"""
+# Licensed under GPLv3+
+import random
+from time import perf_counter
+
+import oead
+
+from bcml.mergers.data import SaveDataMerger, merge_savedata_entries
+
+MODS = 20
+FLAGS_PER_MOD = 5000
+DELETES_PER_MOD = 50
+STOCK_FLAGS = 60000
+HASH_RANGE = range(-(2 ** 31), 2 ** 31)
+
+
+def make_flag(hash_value: int) -> oead.byml.Hash:
+    return oead.byml.Hash(
+        {
+            "DataName": f"Flag_{hash_value & 0xFFFFFFFF:08x}",
+            "HashValue": oead.S32(hash_value),
+        }
+    )
+
+
+def main():
+    rand = random.Random(0)
+    stock_hashes = rand.sample(HASH_RANGE, STOCK_FLAGS)
+    stock = [make_flag(hash_value) for hash_value in stock_hashes]
+    diffs = [
+        oead.byml.Hash(
+            {
+                "add": oead.byml.Array(
+                    [make_flag(rand.choice(HASH_RANGE)) for _ in range(FLAGS_PER_MOD)]
+                ),
+                "del": oead.byml.Array(
+                    [
+                        oead.S32(hash_value)
+                        for hash_value in rand.sample(stock_hashes, DELETES_PER_MOD)
+                    ]
+                ),
+            }
+        )
+        for _ in range(MODS)
+    ]
+
+    start = perf_counter()
+    consolidated = SaveDataMerger().consolidate_diffs(diffs)
+    consolidated_at = perf_counter()
+    merged = merge_savedata_entries(stock, consolidated["add"])
+    merged_at = perf_counter()
+    print(
+        f"Consolidated {MODS} logs of {FLAGS_PER_MOD} flags in "
+        f"{consolidated_at - start:.3f} seconds"
+    )
+    print(
+        f"Merged {len(merged)} flags over {STOCK_FLAGS} stock flags in "
+        f"{merged_at - consolidated_at:.3f} seconds"
+    )
+
+
+if __name__ == "__main__":
+    main()